@@ -0,0 +1,84 @@
+"""
+Benchmark the options filtering on wide and deep options trees, with long lists of patterns.
+
+Usage: python -m benchmarks.bench_options [-n NUMBER] [--width WIDTH] [--depth DEPTH] [--patterns COUNT]
+"""
+import argparse
+import copy
+import logging
+import time
+
+from projectstarter import config
+from projectstarter.commands.start import filter_options
+
+
+def _options_tree(width, depth):
+    """
+    Build an options tree.
+    :param width: Number of options per level
+    :param depth: Number of nested levels
+    :returns: The options tree
+    """
+    tree = {"description": "option"}
+    if depth > 0:
+        tree["options"] = {f"o{i}": _options_tree(width, depth - 1) for i in range(width)}
+    return tree
+
+
+def _patterns(width, depth, count):
+    """
+    Build a list of options patterns, mixing simple and nested ones.
+    :param width: Number of options per level of the tree
+    :param depth: Number of nested levels of the tree
+    :param count: Number of patterns
+    :returns: List of patterns
+    """
+    patterns = []
+    for i in range(count):
+        segments = [f"o{(i * (level + 1)) % width}" for level in range(1 + i % depth)]
+        patterns.append(config.options_sep.join(segments))
+    return patterns
+
+
+def _bench(patterns, tree, number):
+    """
+    Time the options filtering. The tree is filtered in place, so each call
+    gets its own copy, made outside of the measure.
+    :param patterns: List of options patterns
+    :param tree: The options tree
+    :param number: Number of calls
+    :returns: Fastest call, in milliseconds
+    """
+    timings = []
+    for _ in range(number):
+        tree_copy = copy.deepcopy(tree)
+        start_time = time.perf_counter()
+        filter_options(patterns, tree_copy)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the options filtering on wide and deep options trees.")
+    parser.add_argument("-n", "--number", type=int, default=5, help="number of calls")
+    parser.add_argument("--width", type=int, default=300, help="number of options of the wide tree")
+    parser.add_argument("--depth", type=int, default=8, help="depth of the deep tree")
+    parser.add_argument("--patterns", type=int, default=200, help="number of options patterns")
+    args = parser.parse_args()
+
+    logging.getLogger("ProjectStarter").setLevel(logging.CRITICAL)
+    trees = {
+        "wide": (args.width, 2),
+        "deep": (3, args.depth),
+    }
+
+    print(f"{'tree':<10}{'width':>8}{'depth':>8}{'patterns':>10}{'time':>12}")
+    for name, (width, depth) in trees.items():
+        tree = _options_tree(width, depth)
+        patterns = _patterns(width, depth, args.patterns)
+        timing = _bench(patterns, tree, args.number)
+        print(f"{name:<10}{width:>8}{depth:>8}{len(patterns):>10}{timing:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
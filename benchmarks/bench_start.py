@@ -0,0 +1,196 @@
+"""
+Benchmark `project start` and its phases on synthetic large templates.
+
+Usage: python -m benchmarks.bench_start [-o results.json] [-b baseline.json] [options]
+"""
+import argparse
+import copy
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic
+from projectstarter import config
+from projectstarter.commands import start
+from projectstarter.commands.start import copy_template_files, filter_options, parse_commands
+from projectstarter.utils import catalog, templates
+
+# Version of the results format
+VERSION = 1
+
+
+def _fake_run_commands(commands, working_directory, *args, **kwargs):
+    """
+    Stand-in for run_commands: the commands are not executed.
+    """
+    return 0
+
+
+def _data(output_path, template_metadata):
+    """
+    Build the data given to the templates, like `project start` does.
+    """
+    name = os.path.basename(output_path)
+    return {"project": {"path": output_path, "name": name, "slug": name}, **template_metadata}
+
+
+def _benchmarks(work_folder, patterns):
+    """
+    Get the benchmarks to run.
+    :param work_folder: Folder where the projects can be generated
+    :param patterns: Options patterns given to filter_options
+    :returns: Dictionary of benchmark name to function to time
+    """
+    output_path = os.path.join(work_folder, "project")
+    template_metadata = templates.metadata("synthetic")
+    filtered = copy.deepcopy(template_metadata)
+    filtered["options"] = filter_options(patterns, filtered)
+    data = _data(output_path, filtered)
+    parse_commands(copy.deepcopy(data))
+
+    cold_runs = itertools.count()
+
+    def metadata_cold():
+        # Nothing is cached, in memory nor on disk (catalog index, compiled metadata, Jinja bytecode)
+        cache_folder = config.cache_folder
+        config.cache_folder = os.path.join(work_folder, f"cold-cache-{next(cold_runs)}")
+        try:
+            catalog.reset()
+            templates.reset()
+            templates.metadata("synthetic")
+        finally:
+            config.cache_folder = cache_folder
+
+    def metadata_warm():
+        templates.metadata("synthetic")
+
+    def options():
+        filter_options(patterns, copy.deepcopy(template_metadata))
+
+    def commands():
+        parse_commands(copy.deepcopy(data))
+
+    def files():
+        copy_template_files("synthetic", data, output_path, force=True)
+
+    def project_start():
+        args = start.parse("project start", ["synthetic", output_path, "--force", "-o", *patterns])
+        if start.run(args) not in (None, 0):
+            raise Exception("project start failed")
+
+    return {
+        "metadata_cold": metadata_cold,
+        "metadata_warm": metadata_warm,
+        "filter_options": options,
+        "parse_commands": commands,
+        "copy_template_files": files,
+        "project_start": project_start,
+    }
+
+
+def _time(func, repeat):
+    """
+    Time a function.
+    :param func: The function to time
+    :param repeat: Number of runs
+    :returns: Dictionary of statistics, in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start_time)
+    return {"min": min(timings), "median": statistics.median(timings), "runs": repeat}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline.
+    :param results: The benchmark results
+    :param baseline: The baseline results
+    :param tolerance: Allowed slowdown ratio (0.2 means 20% slower)
+    :returns: List of the names of the regressed benchmarks
+    """
+    regressions = []
+    print(f"{'benchmark':<24}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["median"]
+        after = result["median"]
+        ratio = after / before if before > 0 else float("inf")
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(name)
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<24}{before * 1e3:>10.2f}ms{after * 1e3:>10.2f}ms{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark `project start` on synthetic large templates.")
+    parser.add_argument("-o", "--output", metavar="FILE", help="write the results to this JSON file")
+    parser.add_argument("-b", "--baseline", metavar="FILE", help="compare the results with this JSON file")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.2, help="allowed slowdown ratio (default: 0.2)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="number of runs per benchmark")
+    parser.add_argument("-k", "--select", metavar="NAME", nargs="*", help="only run these benchmarks")
+    parser.add_argument("--files", type=int, default=1000, help="number of template files")
+    parser.add_argument("--depth", type=int, default=4, help="depth of the options tree")
+    parser.add_argument("--width", type=int, default=4, help="number of options per level")
+    parser.add_argument("--includes", type=int, default=10, help="length of the include_templates chain")
+    parser.add_argument("--large-size", type=int, default=1024, help="size of the large file, in kilobytes")
+    args = parser.parse_args()
+
+    params = {
+        "files": args.files,
+        "depth": args.depth,
+        "width": args.width,
+        "includes": args.includes,
+        "large_size": args.large_size,
+    }
+    work_folder = tempfile.mkdtemp(prefix="projectstarter-bench-")
+    logging.getLogger("ProjectStarter").setLevel(logging.ERROR)
+    try:
+        config.templates_folder = os.path.join(work_folder, "templates")
+        config.cache_folder = os.path.join(work_folder, "cache")
+        synthetic.generate(config.templates_folder, **params)
+        start.run_commands = _fake_run_commands
+
+        patterns = ["o0:o1:o2", "o1", f"o{args.width - 1}:o0"]
+        results = {
+            "version": VERSION,
+            "python": platform.python_version(),
+            "params": params,
+            "results": {},
+        }
+        for name, func in _benchmarks(work_folder, patterns).items():
+            if args.select and name not in args.select:
+                continue
+            results["results"][name] = _time(func, args.repeat)
+            print(f"{name:<24}{results['results'][name]['median'] * 1e3:>10.2f}ms", file=sys.stderr)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("params") != params:
+            print("warning: the baseline was run with different parameters", file=sys.stderr)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,64 @@
+"""
+Compare the Yaml backends on the largest metadata files.
+
+Usage: python -m benchmarks.bench_yaml [-n NUMBER] [-c COUNT] [path ...]
+"""
+import argparse
+import glob
+import os
+import tempfile
+import timeit
+
+from projectstarter import config
+from projectstarter.utils import io
+
+
+def _largest_metadata_files(count):
+    """
+    Find the largest metadata files of the templates folder.
+    :param count: Number of files to return
+    :returns: List of paths
+    """
+    paths = glob.glob(os.path.join(config.templates_folder, "*", "metadata.yml"))
+    return sorted(paths, key=os.path.getsize, reverse=True)[:count]
+
+
+def _bench(func, number):
+    """
+    Time a function.
+    :param func: The function to time
+    :param number: Number of calls
+    :returns: Mean time of a call, in microseconds
+    """
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Yaml backends on the largest metadata files.")
+    parser.add_argument("paths", metavar="path", nargs="*", help="metadata files (default: largest templates ones)")
+    parser.add_argument("-n", "--number", type=int, default=200, help="number of loads per measure")
+    parser.add_argument("-c", "--count", type=int, default=5, help="number of metadata files to use")
+    args = parser.parse_args()
+
+    paths = args.paths or _largest_metadata_files(args.count)
+    config.cache_folder = tempfile.mkdtemp(prefix="projectstarter-bench-")
+
+    print(f"{'file':<40}{'size':>10}" + "".join(f"{name:>12}" for name in io.backends) + f"{'compiled':>12}")
+    for path in paths:
+        with open(path, "r", encoding="utf8") as f:
+            source = f.read()
+
+        timings = []
+        for name in io.backends:
+            io.use_backend(name)
+            timings.append(_bench(lambda: io.yaml_load_str(source), args.number))
+
+        io.yaml_load_compiled(path)
+        timings.append(_bench(lambda: io.yaml_load_compiled(path), args.number))
+
+        name = os.path.relpath(path, config.templates_folder)
+        print(f"{name:<40}{len(source):>10}" + "".join(f"{t:>10.1f}us" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
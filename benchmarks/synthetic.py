@@ -0,0 +1,97 @@
+"""
+Generate synthetic templates to benchmark against.
+"""
+import os
+
+import yaml
+
+# Content of the generated template files
+FILE_CONTENT = """# {{ project.name }}
+{% for name, option in options.items() %}
+- {{ name }}: {{ option.description }}
+{% endfor %}
+"""
+
+
+def _options_tree(depth, width, path=""):
+    """
+    Generate a tree of nested options.
+    :param depth: Number of nesting levels
+    :param width: Number of options per level
+    :param path: Path of the parent option
+    :returns: Dictionary of options
+    """
+    options = {}
+    for i in range(width):
+        name = f"o{i}"
+        option_path = f"{path}.{name}" if path else name
+        option = {
+            "description": f"synthetic option {option_path}",
+            "commands": [f"echo {option_path}"],
+        }
+        if depth > 1:
+            option["options"] = _options_tree(depth - 1, width, option_path)
+            option["commands"] += [f"{{{{ options.{child}.commands }}}}" for child in option["options"]]
+        options[name] = option
+    return options
+
+
+def _write_template(templates_folder, name, metadata, template_files=None):
+    """
+    Write a template to the templates folder.
+    :param templates_folder: Path to the templates folder
+    :param name: Name of the template
+    :param metadata: Metadata of the template
+    :param template_files: Dictionary of file path to content
+    """
+    template_folder = os.path.join(templates_folder, name)
+    os.makedirs(template_folder)
+    with open(os.path.join(template_folder, "metadata.yml"), "w") as f:
+        yaml.dump(metadata, f)
+    for path, content in (template_files or {}).items():
+        path = os.path.join(template_folder, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def generate(templates_folder, files=1000, files_per_folder=100, depth=4, width=4, includes=10, large_size=1024):
+    """
+    Generate the "synthetic" template and the templates it includes.
+    :param templates_folder: Path to the folder where to write the templates
+    :param files: Number of template files
+    :param files_per_folder: Number of template files per folder
+    :param depth: Depth of the options tree
+    :param width: Number of options per level of the options tree
+    :param includes: Length of the include_templates chain
+    :param large_size: Size of the large file, in kilobytes
+    """
+    # Chain of included templates
+    for i in range(includes):
+        metadata = {
+            "description": f"synthetic included template {i}",
+            "commands": [f"echo chain{i}"],
+            "files": [f"chain{i}.txt.j2"],
+        }
+        if i + 1 < includes:
+            metadata["include_templates"] = [f"chain{i + 1}"]
+        _write_template(templates_folder, f"chain{i}", metadata, {f"chain{i}.txt.j2": FILE_CONTENT})
+
+    # Template files
+    template_files = {}
+    for i in range(files):
+        template_files[f"files/dir{i // files_per_folder}/file{i}.txt.j2"] = FILE_CONTENT
+    large_line = "{{ project.slug }} " + "x" * 60 + "\n"
+    template_files["large.txt.j2"] = large_line * (large_size * 1024 // len(large_line))
+
+    options = _options_tree(depth, width)
+    if includes > 0:
+        options["chain"] = {"description": "included templates", "include_templates": ["chain0"]}
+
+    metadata = {
+        "description": "synthetic template",
+        "commands": [f"{{{{ options.{name}.commands }}}}" for name in options],
+        "files": ["files/", "large.txt.j2"],
+        "options": options,
+    }
+    _write_template(templates_folder, "synthetic", metadata, template_files)
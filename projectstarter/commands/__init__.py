@@ -1,32 +1,41 @@
 import argparse
 import importlib
 import math
-import pkgutil
+import os
 import sys
 
-import projectstarter
 from projectstarter._version import __version__
-from projectstarter.utils import logger
+from projectstarter.utils import daemon, logger, tracing
+
+# Available commands: name -> (description, module implementing the command).
+# The module is only imported when its command is selected.
+COMMANDS = {
+    "bundle": ("pack templates into single-file bundles", "projectstarter.commands.bundle"),
+    "compile": (
+        "precompile templates into the bytecode cache and the catalog index",
+        "projectstarter.commands.compile",
+    ),
+    "info": ("get more information on a template", "projectstarter.commands.info"),
+    "start": ("generate a project from a template", "projectstarter.commands.start"),
+    "serve": ("serve generation requests from a warm daemon", "projectstarter.commands.serve"),
+    "templates": ("list all the available templates", "projectstarter.commands.templates"),
+}
+
+# Main options taking a value, with the environment variable setting them
+_VALUE_OPTIONS = {
+    "--profile": "PROJECTSTARTER_PROFILE",
+    "--cprofile": "PROJECTSTARTER_CPROFILE",
+    "--tracemalloc": "PROJECTSTARTER_TRACEMALLOC",
+    "--log-format": "PROJECTSTARTER_LOG_FORMAT",
+}
 
 
 def _extract_commands():
     """
-    Get list of commands from 'commands' module.
-    :returns: List of string of command's name
+    Get list of commands from the commands registry.
+    :returns: Dictionary of command's name to its description and module name
     """
-    module_names = [
-        module.name for module in pkgutil.iter_modules(projectstarter.commands.__path__)
-    ]
-    commands = {}
-    for module_name in module_names:
-        module = importlib.import_module(f"projectstarter.commands.{module_name}")
-        if module.__doc__ is not None:
-            commands[module_name] = {
-                "description": module.__doc__.strip().lower(),
-                "func_parse": module.__getattribute__("parse"),
-                "func_run": module.__getattribute__("run"),
-            }
-    return commands
+    return {name: {"description": description, "module": module} for name, (description, module) in COMMANDS.items()}
 
 
 def _build_usage_and_desc(commands):
@@ -36,7 +45,10 @@ def _build_usage_and_desc(commands):
     :returns: Tuple(usage string, description string)
     """
     # Build usage
-    usage = "project [-h] [-v] [-V] <command> [options]"
+    usage = (
+        "project [-h] [-v] [-V] [--log-format {text,json}] [--profile FILE] [--cprofile FILE] [--tracemalloc FILE] "
+        "<command> [options]"
+    )
 
     # Build description
     description = "Generate project templates."
@@ -51,10 +63,64 @@ def _build_usage_and_desc(commands):
     return usage, description
 
 
+def dispatch(command, args):
+    """
+    Run a command.
+    :param command: Name of the command
+    :param args: Arguments given to the command
+    :returns: The command's return value
+    """
+    with tracing.span("import command", command=command):
+        module = importlib.import_module(COMMANDS[command][1])
+    with tracing.span("parse command arguments", command=command):
+        cmd_args = module.parse(f"project {command}", args)
+    with tracing.span("run command", command=command):
+        return module.run(cmd_args)
+
+
+def _dispatch_profiled(command, args, trace_file=None, cprofile_file=None, tracemalloc_file=None):
+    """
+    Run a command, writing the requested profiles once it is done.
+    :param command: Name of the command
+    :param args: Arguments given to the command
+    :param trace_file: If set, path of the Chrome trace-event file to write (tracing must be enabled)
+    :param cprofile_file: If set, path of the cProfile stats file to write (see `pstats`)
+    :param tracemalloc_file: If set, path of the tracemalloc snapshot to write (see `tracemalloc.Snapshot.load`)
+    :returns: The command's return value
+    """
+    profiler = None
+    if cprofile_file:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if tracemalloc_file:
+        import tracemalloc
+
+        tracemalloc.start(25)
+
+    try:
+        return dispatch(command, args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_file)
+            logger.info(f"cProfile stats written to '{cprofile_file}'")
+        if tracemalloc_file:
+            tracemalloc.take_snapshot().dump(tracemalloc_file)
+            tracemalloc.stop()
+            logger.info(f"tracemalloc snapshot written to '{tracemalloc_file}'")
+        if trace_file:
+            tracing.write(trace_file)
+            logger.info(f"Trace written to '{trace_file}'")
+
+
 def parse():
     """
     Parse all the main CLI arguments.
     """
+    start = tracing.now()
+
     # Get CLI information
     commands = _extract_commands()
     usage, description = _build_usage_and_desc(commands)
@@ -77,19 +143,61 @@ def parse():
         action="count",
         help="set logging level to DEBUG",
     )
+    parser.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        default=os.environ.get(_VALUE_OPTIONS["--log-format"], "text"),
+        help=(
+            "format of the log messages: 'json' writes one JSON document per message "
+            f"(env: {_VALUE_OPTIONS['--log-format']})"
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        default=os.environ.get(_VALUE_OPTIONS["--profile"]),
+        help=(
+            "write a Chrome trace-event file of the run, to open in chrome://tracing or Perfetto "
+            f"(env: {_VALUE_OPTIONS['--profile']})"
+        ),
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        default=os.environ.get(_VALUE_OPTIONS["--cprofile"]),
+        help=f"write the cProfile stats of the command, to open with pstats (env: {_VALUE_OPTIONS['--cprofile']})",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        metavar="FILE",
+        default=os.environ.get(_VALUE_OPTIONS["--tracemalloc"]),
+        help=(
+            "write a tracemalloc snapshot of the command's memory allocations "
+            f"(env: {_VALUE_OPTIONS['--tracemalloc']})"
+        ),
+    )
     parser.add_argument("command", help="command to run")
 
     # Parse arguments
     first_not_option_arg_pos = len(sys.argv)
+    skip = False
     for i, arg in enumerate(sys.argv[1:]):
-        if arg[0] != "-":
+        if skip:
+            skip = False
+        elif arg in _VALUE_OPTIONS:
+            skip = True
+        elif arg[0] != "-":
             first_not_option_arg_pos = i + 2
             break
 
     args = parser.parse_args(sys.argv[1:first_not_option_arg_pos])
 
     # Set logging level
-    logger.setup(args.verbose or False)
+    logger.setup(args.verbose or False, args.log_format)
+
+    if args.profile:
+        tracing.enable()
+        tracing.add("parse arguments", start, tracing.now())
 
     # Check if command is valid
     if args.command not in commands:
@@ -98,8 +206,15 @@ def parse():
         )
         return 1
 
-    # Dispatch command call
-    cmd_args = commands[args.command]["func_parse"](
-        f"project {args.command}", sys.argv[first_not_option_arg_pos:]
-    )
-    return commands[args.command]["func_run"](cmd_args)
+    cmd_argv = sys.argv[first_not_option_arg_pos:]
+    profiled = args.profile or args.cprofile or args.tracemalloc
+
+    # Use the daemon if it is running (the profiles would be recorded by the daemon's process)
+    if args.command in daemon.COMMANDS and not os.environ.get("PROJECTSTARTER_NO_DAEMON") and not profiled:
+        ret_val = daemon.request(args.command, cmd_argv, bool(args.verbose), args.log_format)
+        if ret_val is not None:
+            return ret_val
+
+    if profiled:
+        return _dispatch_profiled(args.command, cmd_argv, args.profile, args.cprofile, args.tracemalloc)
+    return dispatch(args.command, cmd_argv)
@@ -0,0 +1,60 @@
+"""
+Pack templates into single-file bundles
+"""
+import argparse
+import os
+
+from projectstarter import config
+from projectstarter.utils import bundles, catalog, logger
+
+
+def run(args):
+    """
+    Run the command.
+    :param args: Arguments given to the command
+    """
+    ret_val = 0
+    for name in args.templates:
+        template_entry = catalog.entry(name)
+        if template_entry is None or template_entry["metadata"] is None:
+            logger.error(f"template '{name}' does not exist")
+            ret_val = 1
+            continue
+        if template_entry["bundle"] is not None:
+            logger.error(f"template '{name}' is already a bundle")
+            ret_val = 1
+            continue
+
+        output_path = os.path.join(args.output, name + bundles.EXTENSION)
+        logger.info(f"Packing template '{name}' into '{output_path}'")
+        bundles.build(
+            os.path.join(config.templates_folder, name),
+            template_entry["metadata"],
+            template_entry["files"],
+            output_path,
+        )
+
+    return ret_val
+
+
+def parse(prog, args):
+    """
+    Parse all the arguments given to the command.
+    :param prog: Name of the program
+    :param args: Arguments given to the command
+    """
+    parser = argparse.ArgumentParser(prog=prog, description=__doc__)
+    parser.add_argument(
+        "templates",
+        metavar="template",
+        nargs="+",
+        help="templates to pack (see `project templates` for an exhaustive list)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="FOLDER",
+        default=".",
+        help="folder where to write the bundles (default: current folder)",
+    )
+    return parser.parse_args(args)
@@ -0,0 +1,66 @@
+"""
+Precompile templates into the bytecode cache and the catalog index
+"""
+import argparse
+import os
+
+import jinja2
+
+from projectstarter import config
+from projectstarter.utils import catalog, logger, templates
+
+
+def run(args):
+    """
+    Run the command.
+    :param args: Arguments given to the command
+    """
+    if args.clear:
+        logger.info("Clearing the bytecode cache")
+        templates.clear_cache()
+
+    names = args.templates or list(catalog.entries().keys())
+
+    ret_val = 0
+    for name in names:
+        template_entry = catalog.entry(name)
+        if template_entry is None:
+            logger.error(f"template '{name}' does not exist")
+            ret_val = 1
+            continue
+
+        logger.info(f"Compiling template '{name}'")
+        for file in template_entry["files"]:
+            # Files copied as is are never rendered
+            if not file.endswith(".j2") or file in template_entry["static"]:
+                continue
+            path = os.path.join(config.templates_folder, name, file)
+            try:
+                templates.compile(path)
+            except jinja2.exceptions.TemplateSyntaxError as e:
+                logger.error(f"{path}:{e.lineno}: {e.message}")
+                ret_val = 1
+
+    return ret_val
+
+
+def parse(prog, args):
+    """
+    Parse all the arguments given to the command.
+    :param prog: Name of the program
+    :param args: Arguments given to the command
+    """
+    parser = argparse.ArgumentParser(prog=prog, description=__doc__)
+    parser.add_argument(
+        "templates",
+        metavar="template",
+        nargs="*",
+        help="templates to compile (default: all of them)",
+    )
+    parser.add_argument(
+        "-c",
+        "--clear",
+        action="store_true",
+        help="clear the bytecode cache before compiling",
+    )
+    return parser.parse_args(args)
@@ -0,0 +1,185 @@
+"""
+Serve generation requests from a warm daemon
+"""
+import argparse
+import base64
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import traceback
+
+from projectstarter import commands, config
+from projectstarter._version import __version__
+from projectstarter.utils import catalog, daemon, files, logger, templates
+
+
+class _ClientStream:
+    """
+    Text stream forwarding everything written to it to the client.
+    """
+
+    def __init__(self, wfile, name):
+        self._wfile = wfile
+        self._name = name
+        self.buffer = _ClientBinaryStream(wfile, name)
+
+    def write(self, data):
+        if data:
+            daemon.send(self._wfile, {"stream": self._name, "data": data})
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class _ClientBinaryStream:
+    """
+    Binary stream forwarding everything written to it to the client (archives written to stdout, ...).
+    """
+
+    def __init__(self, wfile, name):
+        self._wfile = wfile
+        self._name = name
+
+    def write(self, data):
+        if data:
+            daemon.send(self._wfile, {"stream": self._name, "bytes": base64.b64encode(data).decode("ascii")})
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handle one request: run the command and stream its output back.
+    """
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode("utf8"))
+
+        if request.get("version") != __version__ or request.get("command") not in daemon.COMMANDS:
+            daemon.send(self.wfile, {"refused": "unsupported request"})
+            return
+        # The daemon serves the templates and the caches it loaded
+        if request["templates_folder"] != config.templates_folder or request["cache_folder"] != config.cache_folder:
+            daemon.send(self.wfile, {"refused": "different templates or cache folder"})
+            return
+
+        # Reload the templates whose files changed
+        if catalog.refresh():
+            logger.info("Templates changed, reloading")
+            templates.reload()
+
+        logger.info(f"Serving `project {request['command']} {' '.join(request['args'])}`")
+        stdout = _ClientStream(self.wfile, "stdout")
+        stderr = _ClientStream(self.wfile, "stderr")
+        # Requests are served one at a time: the command runs in the client's folder, with its environment
+        # variables (PATH, VIRTUAL_ENV, ...) and umask, which the commands and `which` use
+        cwd = os.getcwd()
+        environ = dict(os.environ)
+        umask = os.umask(request["umask"])
+        try:
+            os.environ.clear()
+            os.environ.update(request["environ"])
+            os.chdir(request["cwd"])
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr), logger.redirect(
+                stderr, request["verbose"], request.get("log_format", "text")
+            ):
+                ret_val = commands.dispatch(request["command"], request["args"])
+        except SystemExit as e:
+            ret_val = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            stderr.write(traceback.format_exc())
+            ret_val = 1
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+            os.umask(umask)
+
+        daemon.send(self.wfile, {"exit": ret_val or 0})
+
+
+def _warm_up():
+    """
+    Load the catalog, the metadata and the compiled templates in memory.
+    """
+    for name, template_entry in catalog.entries().items():
+        if templates.metadata(name) is None:
+            continue
+        for file in template_entry["files"]:
+            if file.endswith(".j2"):
+                try:
+                    templates.compile(os.path.join(config.templates_folder, name, file))
+                except Exception as e:
+                    logger.warning(f"unable to compile '{name}/{file}': {e}")
+
+
+def _is_running(socket_path):
+    """
+    Check if a daemon is listening on the given socket.
+    :param socket_path: Path to the socket
+    :returns: True if a daemon answered
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def run(args):
+    """
+    Run the command.
+    :param args: Arguments given to the command
+    """
+    socket_path = args.socket or config.socket_path
+
+    if os.path.exists(socket_path):
+        if _is_running(socket_path):
+            logger.error(f"a daemon is already listening on '{socket_path}'")
+            return 1
+        # Stale socket of a daemon that did not stop properly
+        os.remove(socket_path)
+
+    logger.info("Loading templates")
+    _warm_up()
+
+    files.mkdir(os.path.dirname(socket_path), ignore_errors=True)
+    # Only the current user can connect: the socket is created without permissions for the others
+    umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    finally:
+        os.umask(umask)
+    logger.info(f"Listening on '{socket_path}'")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+    return 0
+
+
+def parse(prog, args):
+    """
+    Parse all the arguments given to the command.
+    :param prog: Name of the program
+    :param args: Arguments given to the command
+    """
+    parser = argparse.ArgumentParser(prog=prog, description=__doc__)
+    parser.add_argument(
+        "-s",
+        "--socket",
+        metavar="PATH",
+        help=f"path of the socket to listen on (default: {config.socket_path})",
+    )
+    return parser.parse_args(args)
@@ -3,24 +3,36 @@ Generate a project from a template
 """
 import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
 
+import yaml
 from slugify import slugify
 
 from projectstarter import config
+from projectstarter.commands.start import manifest, outputs
 from projectstarter.commands.start.commands import parse_commands, run_commands
 from projectstarter.commands.start.files import copy_template_files
 from projectstarter.commands.start.options import filter_options
-from projectstarter.utils import templates
+from projectstarter.utils import io, templates, tracing
 from projectstarter.utils import logger
 
 
-def run(args):
+def _start_project(template, output, options, force, args, jobs, update=False, archive=None):
     """
-    Run the command.
-    :param args: Arguments given to the command
+    Generate a project from a template.
+    :param template: Name of the template to use
+    :param output: Destination folder
+    :param options: Options patterns to activate
+    :param force: Should the destination folder be removed if it already exists
+    :param args: Arguments given to the command, for the shared settings
+    :param jobs: Number of parallel workers to use for this project
+    :param update: Should an existing project be updated in place (only the changes are applied)
+    :param archive: If set, path of an archive ("-" for the standard output) to write the project to,
+        instead of the destination folder. The commands are not run.
+    :return: 0 on success, 1 on error.
     """
     # Init some useful variables
-    output_path = os.path.abspath(args.output)
+    output_path = os.path.abspath(output)
     project_name = os.path.basename(output_path)
     data = {
         "project": {
@@ -31,37 +43,178 @@ def run(args):
     }
 
     # Load template metadata
-    logger.info(f"Loading template '{args.template}'")
-    template_metadata = templates.metadata(args.template)
+    logger.info(f"Loading template '{template}'")
+    with tracing.span("load metadata", template=template):
+        template_metadata = templates.metadata(template)
     if template_metadata is None:
         return 1
 
     # Keep only requested options
-    template_metadata["options"] = filter_options(args.options, template_metadata)
+    with tracing.span("filter options", options=options):
+        template_metadata["options"] = filter_options(options, template_metadata)
     if template_metadata["options"] is None:
         return 1
 
     # Complete data for future parsing
     data = {**data, **template_metadata}
-    logger.debug(f"Data: {data}")
+    logger.debug("Data:", data)
 
     # Parse commands
-    parse_commands(data)
-    commands = data["commands"]
-    logger.debug(f"Commands: {commands}")
+    with tracing.span("parse commands"):
+        parse_commands(data)
+    commands = data.get("commands", [])
+    logger.debug("Commands:", commands)
+
+    if archive is not None:
+        if update:
+            logger.error("an archive can not be updated")
+            return 1
+        project_output = outputs.ArchiveOutput(
+            archive, args.archive_format or outputs.archive_format(archive), project_name
+        )
+        if len(commands) > 0:
+            logger.warning(f"{len(commands)} command(s) not run: the project is written to an archive")
+            commands = []
+    else:
+        project_output = outputs.DirectoryOutput(output_path)
 
-    logger.info(f"Creating project '{project_name}'")
+    previous = manifest.load(output_path) if update else None
+    logger.info(f"{'Updating' if update else 'Creating'} project '{project_name}'")
 
     try:
-        copy_template_files(args.template, data, output_path, args.force)
-        run_commands(commands, output_path)
+        with tracing.span("copy files", jobs=jobs, executor=args.executor):
+            generated_files = copy_template_files(
+                template,
+                data,
+                project_output,
+                force,
+                jobs,
+                args.executor,
+                previous["files"] if update else None,
+            )
+        # Move the project into place before running its commands
+        with tracing.span("close output"):
+            project_output.close()
+        if update:
+            commands, fingerprints = manifest.pending_commands(commands, output_path, previous["commands"])
+            logger.debug("Commands to run again:", commands)
+        with tracing.span("run commands", count=len(commands)):
+            ret_val = run_commands(
+                commands,
+                output_path,
+                jobs,
+                args.command_timeout,
+                args.command_logs,
+                args.stderr_tail * 1024,
+                not args.no_command_cache,
+            )
+        if update:
+            manifest.save(
+                output_path,
+                {
+                    "template": template,
+                    "options": options,
+                    "files": generated_files,
+                    # Failed commands have to run again on the next update
+                    "commands": fingerprints if ret_val == 0 else previous["commands"],
+                },
+            )
     except Exception as e:
+        project_output.abort()
         logger.error(e)
         return 1
+    finally:
+        logger.debug("Compiled strings cache:", templates.cache_info())
 
     # Success message
+    if archive is not None:
+        logger.info(f"Project written to '{'<stdout>' if archive == '-' else archive}'")
+        return ret_val
     logger.info(f"Project created at '{output_path}'")
     logger.info(f"Run `grep -Ri FIXME '{output_path}'` to complete the setup")
+    return ret_val
+
+
+def _load_batch(path):
+    """
+    Load and check a batch manifest.
+    :param path: Path to the manifest
+    :return: List of projects on success. None on error.
+    """
+    try:
+        projects = io.yaml_load(path)
+    except yaml.YAMLError as e:
+        logger.error(f"invalid batch manifest '{path}': {e}")
+        return None
+    if projects is None:
+        logger.error(f"batch manifest '{path}' is missing or empty")
+        return None
+    if not isinstance(projects, list):
+        logger.error(f"batch manifest '{path}' should be a list of projects")
+        return None
+
+    for i, project in enumerate(projects):
+        if not isinstance(project, dict) or "template" not in project or "output" not in project:
+            logger.error(f"batch manifest '{path}': project {i + 1} needs a 'template' and an 'output' field")
+            return None
+    return projects
+
+
+def _run_batch(args):
+    """
+    Generate every project of a batch manifest, in parallel.
+    :param args: Arguments given to the command
+    :return: 0 if every project was generated, 1 otherwise.
+    """
+    projects = _load_batch(args.batch)
+    if projects is None:
+        return 1
+
+    # The workers limit is global: each project is generated by a single worker
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        futures = [
+            pool.submit(
+                _start_project,
+                project["template"],
+                project["output"],
+                project.get("options", []),
+                project.get("force", args.force),
+                args,
+                1,
+                project.get("update", args.update),
+                project.get("archive"),
+            )
+            for project in projects
+        ]
+        ret_vals = []
+        for future in futures:
+            try:
+                ret_vals.append(future.result())
+            except Exception as e:
+                logger.error(e)
+                ret_vals.append(1)
+
+    # Summary
+    logger.info("Batch summary:")
+    for project, ret_val in zip(projects, ret_vals):
+        status = "ok" if ret_val == 0 else "failed"
+        logger.info(f"{status.ljust(8)}{project['output']} ({project['template']})", prefix="  ")
+    failed = sum(1 for ret_val in ret_vals if ret_val != 0)
+    logger.info(f"{len(projects) - failed} project(s) created, {failed} failed")
+
+    return 0 if failed == 0 else 1
+
+
+def run(args):
+    """
+    Run the command.
+    :param args: Arguments given to the command
+    """
+    if args.batch is not None:
+        return _run_batch(args)
+    return _start_project(
+        args.template, args.output, args.options, args.force, args, args.jobs, args.update, args.archive
+    )
 
 
 def parse(prog, args):
@@ -73,9 +226,19 @@ def parse(prog, args):
     parser = argparse.ArgumentParser(prog=prog, description=__doc__)
     parser.add_argument(
         "template",
+        nargs="?",
         help="template to use (see `project templates` for an exhaustive list)",
     )
-    parser.add_argument("output", help="destination folder")
+    parser.add_argument("output", nargs="?", help="destination folder")
+    parser.add_argument(
+        "-b",
+        "--batch",
+        metavar="MANIFEST",
+        help=(
+            "generate every project listed in a Yaml manifest "
+            "(list of 'template', 'output', 'options', 'force', 'update' and 'archive')"
+        ),
+    )
     parser.add_argument(
         "-o",
         "--options",
@@ -84,10 +247,87 @@ def parse(prog, args):
         default=[],
         help=f"filter options to activate (nested options are accessible by using the '{config.options_sep}' separator)",
     )
-    parser.add_argument(
+    overwrite = parser.add_mutually_exclusive_group()
+    overwrite.add_argument(
         "-f",
         "--force",
         action="store_true",
-        help="erase destination directory if it exists",
+        help="replace the destination directory if it exists (the old one is removed in the background)",
     )
-    return parser.parse_args(args)
+    overwrite.add_argument(
+        "-u",
+        "--update",
+        action="store_true",
+        help=(
+            "update the destination directory in place: only write the files whose content changed, "
+            "remove the files no longer generated and only run the commands whose inputs changed "
+            f"(state kept in '{config.manifest_name}')"
+        ),
+    )
+    parser.add_argument(
+        "-a",
+        "--archive",
+        metavar="FILE",
+        help=(
+            "write the project to a tar or zip archive ('-' for the standard output) instead of the destination "
+            "folder, the commands are not run"
+        ),
+    )
+    parser.add_argument(
+        "--archive-format",
+        choices=sorted(set(outputs.ARCHIVE_FORMATS.values())),
+        default=None,
+        help="format of the archive (default: guessed from its extension, else tar)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        metavar="N",
+        type=int,
+        default=1,
+        help=(
+            "number of parallel workers used to generate the files and run the commands, "
+            "or the projects with --batch (default: 1)"
+        ),
+    )
+    parser.add_argument(
+        "--executor",
+        choices=["thread", "process"],
+        default="thread",
+        help="type of workers: 'thread' for I/O bound, 'process' for CPU bound rendering (default: thread)",
+    )
+    parser.add_argument(
+        "--command-timeout",
+        metavar="SECONDS",
+        type=float,
+        default=None,
+        help="kill the commands still running after this number of seconds",
+    )
+    parser.add_argument(
+        "--command-logs",
+        metavar="FOLDER",
+        default=None,
+        help="write the output of each command to a file in this folder (relative to the destination folder)",
+    )
+    parser.add_argument(
+        "--stderr-tail",
+        metavar="KB",
+        type=int,
+        default=config.command_stderr_tail // 1024,
+        help=f"kilobytes of a failed command's stderr to display (default: {config.command_stderr_tail // 1024})",
+    )
+    parser.add_argument(
+        "--no-command-cache",
+        action="store_true",
+        help="run the commands marked as cacheable instead of replaying their effects from the cache",
+    )
+    args = parser.parse_args(args)
+
+    if args.batch is None and (args.template is None or args.output is None):
+        parser.error("the template and output arguments are required without --batch")
+    if args.batch is not None and args.template is not None:
+        parser.error("the template and output arguments can not be used with --batch")
+    if args.archive is not None and (args.update or args.batch is not None):
+        parser.error("the --archive argument can not be used with --update or --batch")
+
+    return args
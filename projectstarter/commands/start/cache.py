@@ -0,0 +1,339 @@
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+
+from projectstarter import config
+from projectstarter.commands.start import manifest
+from projectstarter.utils import files, logger
+
+# Version of the cache entries format
+_VERSION = 2
+
+# Placeholder replacing the project's path in the captured text files, so that they can be replayed elsewhere
+_PLACEHOLDER = b"@@PROJECTSTARTER_WORKING_DIRECTORY@@"
+
+# Blobs written less than this number of seconds ago are never evicted: their entry may still be written
+_BLOB_GRACE = 600
+
+# Minimum number of seconds between two evictions, which read every entry of the cache
+_EVICT_INTERVAL = 3600
+
+# Lock serializing the cache updates of this process
+_lock = threading.Lock()
+
+
+def _folder():
+    """
+    Get the folder of the commands cache.
+    :returns: Path to the folder
+    """
+    return os.path.join(config.cache_folder, "commands")
+
+
+def _entry_path(key):
+    """
+    Get the path of a cache entry.
+    :param key: The command's cache key
+    :returns: Path to the entry file
+    """
+    return os.path.join(_folder(), "entries", key + ".json")
+
+
+def _blob_path(blob):
+    """
+    Get the path of a stored content.
+    :param blob: Hash of the content
+    :returns: Path to the blob file
+    """
+    return os.path.join(_folder(), "blobs", blob[:2], blob)
+
+
+def key(command, working_directory):
+    """
+    Get the cache key of a command: it changes with the rendered command and the content of its declared inputs.
+    :param command: Normalized command
+    :param working_directory: Path to the folder where the command is executed
+    :returns: Hexadecimal key
+    """
+    return manifest.content_hash(f"{_VERSION}:{manifest.command_fingerprint(command, working_directory)}")
+
+
+def _scan(working_directory, exclude=None):
+    """
+    Get the state of every file, folder and symbolic link of a folder.
+    :param working_directory: Path to the folder
+    :param exclude: List of paths (relative to the folder) to skip
+    :returns: Dictionary of relative path to (kind, mode, size, mtime)
+    """
+    exclude = set(exclude or [])
+    state = {}
+    folders = [""]
+    while folders:
+        relative_folder = folders.pop()
+        with os.scandir(os.path.join(working_directory, relative_folder)) as it:
+            for entry in it:
+                path = f"{relative_folder}/{entry.name}" if relative_folder else entry.name
+                if path in exclude:
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                if stat.S_ISLNK(st.st_mode):
+                    kind = "symlink"
+                elif stat.S_ISDIR(st.st_mode):
+                    kind = "dir"
+                    folders.append(path)
+                else:
+                    kind = "file"
+                state[path] = (kind, stat.S_IMODE(st.st_mode), st.st_size, st.st_mtime_ns)
+    return state
+
+
+def snapshot(working_directory, exclude=None):
+    """
+    Record the state of a folder before a command runs, to capture its effects afterwards.
+    :param working_directory: Path to the folder
+    :param exclude: List of paths (relative to the folder) to skip
+    :returns: Dictionary of relative path to (kind, mode, size, mtime). None if the folder can not be read.
+    """
+    try:
+        return _scan(working_directory, exclude)
+    except OSError as e:
+        logger.warning(f"unable to record the project's state, the command is not cached: {e}")
+        return None
+
+
+def _write_blob(content):
+    """
+    Add a content to the blobs store, unless it is already there.
+    :param content: Bytes content
+    :returns: Name of the blob
+    """
+    blob = hashlib.sha256(content).hexdigest()
+    path = _blob_path(blob)
+    if os.path.exists(path):
+        # Protect the blob from a concurrent eviction until its entry is written
+        os.utime(path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        files.write_atomic(path, content)
+    return blob
+
+
+def _capture(working_directory, before, after):
+    """
+    Store the effects of a command, from the state of the folder before and after it ran.
+    :param working_directory: Path to the folder where the command ran
+    :param before: State of the folder before the command (see `snapshot`)
+    :param after: State of the folder after the command
+    :returns: Tuple(list of effects, True if the effects only apply to this working directory)
+    """
+    pattern = files.path_pattern(working_directory)
+    effects = []
+    bound = False
+
+    for path in sorted(set(before) - set(after)):
+        effects.append({"path": path, "kind": "deleted"})
+
+    for path, state in sorted(after.items()):
+        if before.get(path) == state:
+            continue
+        kind, mode = state[0], state[1]
+        absolute_path = os.path.join(working_directory, path)
+        effect = {"path": path, "kind": kind, "mode": mode}
+        if kind == "symlink":
+            target = os.readlink(absolute_path)
+            if target == working_directory or target.startswith(working_directory + os.sep):
+                effect["relocate"] = True
+                target = os.path.relpath(target, working_directory)
+            effect["target"] = target
+        elif kind == "file":
+            with open(absolute_path, "rb") as f:
+                content = f.read()
+            if pattern.search(content):
+                if b"\0" in content:
+                    # The path can not be replaced in binary files
+                    bound = True
+                else:
+                    effect["relocate"] = True
+                    content = pattern.sub(lambda m: _PLACEHOLDER, content)
+            effect["blob"] = _write_blob(content)
+            effect["size"] = len(content)
+        effects.append(effect)
+
+    return effects, bound
+
+
+def store(key, working_directory, before, exclude=None):
+    """
+    Capture the effects of a command on its working directory and store them in the cache.
+    Errors are reported as warnings: the cache is an optimization.
+    :param key: The command's cache key (see `key`)
+    :param working_directory: Path to the folder where the command ran
+    :param before: State of the folder before the command ran (see `snapshot`)
+    :param exclude: List of paths (relative to the folder) to skip
+    """
+    try:
+        with _lock:
+            after = _scan(working_directory, exclude)
+            effects, bound = _capture(working_directory, before, after)
+            entry = {
+                "version": _VERSION,
+                "working_directory": working_directory if bound else None,
+                "effects": effects,
+            }
+            path = _entry_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            files.write_atomic(path, json.dumps(entry).encode("utf8"))
+        _evict_if_due()
+    except OSError as e:
+        logger.warning(f"unable to store the command's effects in the cache: {e}")
+
+
+def _load(key, working_directory):
+    """
+    Load a cache entry, if it can be replayed in the working directory.
+    :param key: The command's cache key
+    :param working_directory: Path to the folder where the command would run
+    :returns: The cache entry. None on a miss.
+    """
+    try:
+        with open(_entry_path(key), "r", encoding="utf8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("version") != _VERSION:
+        return None
+    if entry["working_directory"] not in (None, working_directory):
+        return None
+    for effect in entry["effects"]:
+        if "blob" in effect and not os.path.isfile(_blob_path(effect["blob"])):
+            return None
+    return entry
+
+
+def _remove(path):
+    """
+    Remove a file, symbolic link or folder, if it exists.
+    :param path: The path to remove
+    """
+    if os.path.isdir(path) and not os.path.islink(path):
+        files.rm(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def replay(key, working_directory):
+    """
+    Apply the stored effects of a command to its working directory, instead of running it.
+    :param key: The command's cache key (see `key`)
+    :param working_directory: Path to the folder where the command would run
+    :returns: True if the effects were replayed. False on a miss.
+    """
+    entry = _load(key, working_directory)
+    if entry is None:
+        return False
+
+    wd = os.fsencode(working_directory)
+    try:
+        for effect in entry["effects"]:
+            path = os.path.join(working_directory, effect["path"])
+            kind = effect["kind"]
+            if kind == "dir":
+                if os.path.lexists(path) and not os.path.isdir(path):
+                    _remove(path)
+                os.makedirs(path, exist_ok=True)
+                os.chmod(path, effect["mode"])
+                continue
+
+            _remove(path)
+            if kind == "symlink":
+                target = effect["target"]
+                os.symlink(os.path.join(working_directory, target) if effect.get("relocate") else target, path)
+            elif kind == "file":
+                blob = _blob_path(effect["blob"])
+                if effect.get("relocate"):
+                    with open(blob, "rb") as f:
+                        content = f.read().replace(_PLACEHOLDER, wd)
+                    with open(path, "wb") as f:
+                        f.write(content)
+                else:
+                    files.copy_range(blob, path, effect["size"])
+                os.chmod(path, effect["mode"])
+    except OSError as e:
+        logger.warning(f"unable to replay the command's effects from the cache: {e}")
+        return False
+
+    # Mark the entry as recently used
+    try:
+        os.utime(_entry_path(key))
+    except OSError:
+        pass
+    return True
+
+
+def _evict_if_due():
+    """
+    Evict the cache (see `evict`) unless it was done less than `_EVICT_INTERVAL` seconds ago,
+    by this process or another one: the modification time of a marker file records the last eviction.
+    """
+    marker = os.path.join(_folder(), "evicted")
+    try:
+        if time.time() - os.stat(marker).st_mtime < _EVICT_INTERVAL:
+            return
+    except FileNotFoundError:
+        pass
+    # Mark the eviction first, so that concurrent stores skip it
+    with open(marker, "a"):
+        pass
+    os.utime(marker)
+    evict()
+
+
+def evict(max_size=None, max_age=None):
+    """
+    Remove the cache entries unused for too long, then the least recently used ones
+    until the stored blobs fit in the maximum size, then the blobs no entry uses.
+    :param max_size: Maximum size of the blobs, in bytes (default: config.command_cache_size)
+    :param max_age: Maximum number of seconds since an entry was last used (default: config.command_cache_age)
+    """
+    max_size = config.command_cache_size if max_size is None else max_size
+    max_age = config.command_cache_age if max_age is None else max_age
+    now = time.time()
+
+    entries_folder = os.path.join(_folder(), "entries")
+    blobs_folder = os.path.join(_folder(), "blobs")
+    try:
+        names = os.listdir(entries_folder)
+    except FileNotFoundError:
+        names = []
+
+    entries = []
+    for name in names:
+        path = os.path.join(entries_folder, name)
+        try:
+            used = os.stat(path).st_mtime
+            with open(path, "r", encoding="utf8") as f:
+                effects = json.load(f)["effects"]
+        except (OSError, ValueError, KeyError):
+            continue
+        entries.append((used, path, {e["blob"]: e["size"] for e in effects if "blob" in e}))
+
+    # Keep the most recently used entries
+    kept_blobs = {}
+    kept_size = 0
+    for used, path, blobs in sorted(entries, reverse=True):
+        new_blobs = {blob: size for blob, size in blobs.items() if blob not in kept_blobs}
+        if now - used > max_age or kept_size + sum(new_blobs.values()) > max_size:
+            logger.debug("evicting command cache entry", path)
+            files.rm(path)
+        else:
+            kept_blobs.update(new_blobs)
+            kept_size += sum(new_blobs.values())
+
+    for prefix in os.listdir(blobs_folder) if os.path.isdir(blobs_folder) else []:
+        for blob in os.listdir(os.path.join(blobs_folder, prefix)):
+            path = os.path.join(blobs_folder, prefix, blob)
+            if blob not in kept_blobs and now - os.stat(path).st_mtime > _BLOB_GRACE:
+                os.remove(path)
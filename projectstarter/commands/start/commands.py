@@ -1,8 +1,39 @@
-import subprocess
+import asyncio
+import contextlib
+import os
+import signal
+import sys
+import threading
 
 import jinja2
 
-from projectstarter.utils import logger, templates, io
+from projectstarter import config
+from projectstarter.commands.start import cache as command_cache
+from projectstarter.commands.start import venvs
+from projectstarter.utils import files, logger, templates, io, tracing
+
+# Lock protecting the installation of the child watcher
+_watcher_lock = threading.Lock()
+
+# Base class of the child watchers (only needed, and not deprecated, before Python 3.8)
+_ChildWatcher = asyncio.AbstractChildWatcher if sys.version_info < (3, 8) and sys.platform != "win32" else object
+
+
+def _parse_command(command, data):
+    """
+    Render a command with the given context. Mapping commands have
+    every one of their string fields rendered.
+    :param command: The command to render (string, list or dictionary)
+    :param data: The data to give to the renderer
+    :return: The rendered command
+    """
+    if isinstance(command, dict):
+        return {k: _parse_command(v, data) for k, v in command.items()}
+    if isinstance(command, list):
+        return [_parse_command(v, data) for v in command]
+    if isinstance(command, str):
+        return templates.parse_string(command, data)
+    return command
 
 
 def parse_commands(data):
@@ -27,8 +58,15 @@ def parse_commands(data):
         parsed_commands = []
 
         for command in commands:
-            logger.debug(f"parsing command: {command}")
+            logger.debug("parsing command:", command)
             try:
+                if isinstance(command, dict):
+                    command = _parse_command(command, data)
+                    # An empty command should not be executed
+                    if command.get("run"):
+                        parsed_commands.append(command)
+                    continue
+
                 out = templates.parse_string(command, data)
 
                 # Since the above returns a string, we need to parse it
@@ -47,29 +85,438 @@ def parse_commands(data):
         data["commands"] = parsed_commands
 
 
-def run_commands(commands, working_directory):
+def _normalize_command(command):
+    """
+    Convert a command to its mapping form.
+    :param command: The command (string or dictionary)
+    :return: Dictionary with at least the "run", "group" and "after" fields
+    """
+    if not isinstance(command, dict):
+        command = {"run": command}
+    command = {"group": None, "after": [], **command}
+    if not isinstance(command["after"], list):
+        command["after"] = [command["after"]]
+    return command
+
+
+def _dependencies(commands):
+    """
+    Compute the commands each command has to wait for.
+    Commands of the same group run in order, a group waits for the groups
+    listed in its "after" field and a command without group waits for every
+    command before it (and every command after it waits for it).
+    :param commands: List of normalized commands
+    :return: List of the set of dependencies indexes of each command
+    """
+    groups = {}
+    for i, command in enumerate(commands):
+        if command["group"] is not None:
+            groups.setdefault(command["group"], []).append(i)
+
+    dependencies = []
+    last_barrier = None
+    last_in_group = {}
+    for i, command in enumerate(commands):
+        group = command["group"]
+        if group is None:
+            deps = set(range(0 if last_barrier is None else last_barrier, i))
+            last_barrier = i
+            last_in_group = {}
+        else:
+            deps = set()
+            if last_barrier is not None:
+                deps.add(last_barrier)
+            if group in last_in_group:
+                deps.add(last_in_group[group])
+            last_in_group[group] = i
+            for after in command["after"]:
+                if after not in groups:
+                    raise Exception(f"command '{command['run']}' depends on unknown group '{after}'")
+                deps.update(groups[after])
+        dependencies.append(deps)
+
+    return dependencies
+
+
+def _check_cycles(commands, dependencies):
+    """
+    Ensure the commands dependencies do not contain any cycle.
+    :param commands: List of normalized commands
+    :param dependencies: List of the set of dependencies indexes of each command
+    """
+    done = set()
+    visiting = set()
+
+    def visit(i):
+        if i in done:
+            return
+        if i in visiting:
+            raise Exception(f"commands dependency cycle detected on '{commands[i]['run']}'")
+        visiting.add(i)
+        for dep in dependencies[i]:
+            visit(dep)
+        visiting.remove(i)
+        done.add(i)
+
+    for i in range(len(commands)):
+        visit(i)
+
+
+class _RingBuffer:
+    """
+    Bytes buffer keeping only the last `size` bytes written to it.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._data = bytearray()
+
+    def write(self, data):
+        self._data += data
+        if len(self._data) > self._size:
+            del self._data[: len(self._data) - self._size]
+
+    def getvalue(self):
+        return bytes(self._data)
+
+
+async def _read_lines(stream, max_line_len=64 * 1024):
+    """
+    Asynchronous generator yielding the lines of a stream as they arrive.
+    Lines longer than `max_line_len` are split to keep memory bounded.
+    :param stream: The stream to read from
+    :param max_line_len: Maximum length of a line
+    """
+    pending = b""
+    while True:
+        chunk = await stream.read(max_line_len)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line + b"\n"
+        while len(pending) >= max_line_len:
+            yield pending[:max_line_len]
+            pending = pending[max_line_len:]
+    if pending:
+        yield pending
+
+
+class _ThreadedChildWatcher(_ChildWatcher):
+    """
+    Child watcher waiting for each process in its own thread, so that the event loops
+    of any thread can run processes (the default watcher of Python 3.8 and later).
+    The default watcher of Python 3.7 handles SIGCHLD, which only works in the main
+    thread's current loop.
+    """
+
+    def add_child_handler(self, pid, callback, *args):
+        threading.Thread(target=self._wait, args=(pid, callback, args), daemon=True).start()
+
+    def _wait(self, pid, callback, args):
+        try:
+            _, status = os.waitpid(pid, 0)
+        except ChildProcessError:
+            # The process was already waited for elsewhere
+            returncode = 255
+        else:
+            returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        try:
+            # The loop's callback hands the return code to the loop's thread
+            callback(pid, returncode, *args)
+        except RuntimeError:
+            # The loop was closed meanwhile (e.g. the command was cancelled)
+            pass
+
+    def remove_child_handler(self, pid):
+        return False
+
+    def attach_loop(self, loop):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def _install_child_watcher():
+    """
+    Let the event loops of every thread run processes on Python 3.7 (see `_ThreadedChildWatcher`).
+    """
+    if sys.version_info >= (3, 8) or sys.platform == "win32":
+        return
+    with _watcher_lock:
+        policy = asyncio.get_event_loop_policy()
+        if not isinstance(policy.get_child_watcher(), _ThreadedChildWatcher):
+            policy.set_child_watcher(_ThreadedChildWatcher())
+
+
+def _kill(p):
+    """
+    Kill a process and every process of its group.
+    :param p: The process to kill
+    """
+    if p.returncode is not None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(p.pid, signal.SIGKILL)
+        else:
+            p.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def _run_command(command, working_directory, label, log_file=None, timeout=None, stderr_tail=None):
+    """
+    Run a single command in the given folder, streaming its output line by
+    line to the logger (or to the log file) as it is produced.
+    :param command: Normalized command to execute
+    :param working_directory: Path to the folder where the command should be executed
+    :param label: Label prefixed to each logged line
+    :param log_file: If set, binary file to write the command output to
+    :param timeout: If set, number of seconds after which the command is killed
+    :param stderr_tail: Number of bytes of stderr to keep for error reports
+    :return: Tuple(return code, last bytes of stderr). The return code is None on timeout.
+    """
+    tail = _RingBuffer(stderr_tail if stderr_tail is not None else config.command_stderr_tail)
+
+    p = await asyncio.create_subprocess_shell(
+        command["run"],
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=working_directory,
+        start_new_session=True,
+    )
+
+    async def pump(stream, is_stderr):
+        async for line in _read_lines(stream):
+            if is_stderr:
+                tail.write(line)
+            if log_file is not None:
+                log_file.write(line)
+            else:
+                logger.debug(label, line.rstrip())
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(pump(p.stdout, False), pump(p.stderr, True), p.wait()),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        _kill(p)
+        await p.wait()
+        return None, tail.getvalue()
+    except BaseException:
+        _kill(p)
+        raise
+
+    return p.returncode, tail.getvalue()
+
+
+def _environments(commands, dependencies, working_directory):
+    """
+    Group the commands building the same virtual environment (see `venvs`).
+    Each command of an environment is made to wait for the previous one.
+    :param commands: List of normalized commands
+    :param dependencies: List of the set of dependencies indexes of each command, edited in place
+    :param working_directory: Path to the folder where the commands should be executed
+    :return: Dictionary of environment path to a dictionary with the "key", "commands" (indexes),
+        "cloned" and "ret_vals" fields
+    """
+    environments = {}
+    for i, command in enumerate(commands):
+        env = venvs.environment(command)
+        if env is None:
+            continue
+        if env["path"] in environments:
+            indexes = environments[env["path"]]["commands"]
+            dependencies[i].add(indexes[-1])
+            indexes.append(i)
+        else:
+            environments[env["path"]] = {"env": env, "commands": [i], "cloned": False, "ret_vals": []}
+
+    for environment in environments.values():
+        runs = [commands[i]["run"] for i in environment["commands"]]
+        environment["key"] = venvs.key(environment.pop("env"), runs, working_directory)
+    return environments
+
+
+@contextlib.asynccontextmanager
+async def _alone(semaphore, lock, slots):
+    """
+    Asynchronous context manager holding every slot of a semaphore: nothing else runs meanwhile.
+    :param semaphore: The semaphore limiting the number of running commands
+    :param lock: Lock serializing the acquisitions of every slot
+    :param slots: Number of slots of the semaphore
+    """
+    async with lock:
+        for _ in range(slots):
+            await semaphore.acquire()
+    try:
+        yield
+    finally:
+        for _ in range(slots):
+            semaphore.release()
+
+
+async def _schedule(
+    commands, dependencies, working_directory, jobs, timeout, log_folder, stderr_tail, use_cache, environments
+):
+    """
+    Run the commands as soon as their dependencies are done, with at most
+    `jobs` commands running at the same time.
+    :param commands: List of normalized commands
+    :param dependencies: List of the set of dependencies indexes of each command
+    :param working_directory: Path to the folder where the commands should be executed
+    :param jobs: Maximum number of commands running at the same time
+    :param timeout: Default timeout of a command, in seconds
+    :param log_folder: If set, folder where to write the output of each command
+    :param stderr_tail: Number of bytes of stderr to keep for error reports
+    :param use_cache: Should the effects of the commands with a "cache" field be replayed from the cache
+    :param environments: The virtual environments built by the commands, which are cloned from the pool
+        when possible (see `_environments`)
+    :return: List of the return code of each command
+    """
+    slots = max(jobs, 1)
+    semaphore = asyncio.Semaphore(slots)
+    exclusive = asyncio.Lock()
+    loop = asyncio.get_event_loop()
+    # The commands output is not part of their effects
+    excluded = [] if log_folder is None else [os.path.relpath(log_folder, working_directory).replace(os.sep, "/")]
+    tasks = []
+
+    async def execute(i, command, label, command_timeout):
+        logger.info(f"Running command {label} '{command['run']}'")
+        if log_folder is None:
+            return await _run_command(command, working_directory, label, None, command_timeout, stderr_tail)
+        with open(os.path.join(log_folder, f"{i + 1:02d}.log"), "wb") as log_file:
+            return await _run_command(command, working_directory, label, log_file, command_timeout, stderr_tail)
+
+    async def run(i):
+        for dep in dependencies[i]:
+            await tasks[dep]
+
+        command = commands[i]
+        label = f"[{i + 1}]"
+        command_timeout = command.get("timeout", timeout)
+        cache_key = command_cache.key(command, working_directory) if use_cache and command.get("cache") else None
+        env = venvs.environment(command)
+        environment = environments.get(env["path"]) if env is not None else None
+        start = tracing.now()
+
+        if environment is not None and i == environment["commands"][0]:
+            environment["cloned"] = await loop.run_in_executor(
+                None, venvs.clone, environment["key"], working_directory, env["path"]
+            )
+            if environment["cloned"]:
+                logger.info(f"Environment '{env['path']}' cloned from the pool")
+
+        if environment is not None and environment["cloned"]:
+            logger.info(f"Skipped command {label} '{command['run']}': its environment is already built")
+            ret_val, stderr = 0, b""
+        elif cache_key is not None and await loop.run_in_executor(
+            None, command_cache.replay, cache_key, working_directory
+        ):
+            logger.info(f"Replayed command {label} '{command['run']}' from the cache")
+            ret_val, stderr = 0, b""
+        elif cache_key is not None:
+            # The command runs alone, so that the changes of the project are only its own
+            async with _alone(semaphore, exclusive, slots):
+                before = await loop.run_in_executor(None, command_cache.snapshot, working_directory, excluded)
+                ret_val, stderr = await execute(i, command, label, command_timeout)
+                if ret_val == 0 and before is not None:
+                    await loop.run_in_executor(
+                        None, command_cache.store, cache_key, working_directory, before, excluded
+                    )
+        else:
+            async with semaphore:
+                ret_val, stderr = await execute(i, command, label, command_timeout)
+
+        # Once every command of an environment succeeded, the environment is added to the pool
+        if environment is not None and not environment["cloned"]:
+            environment["ret_vals"].append(ret_val)
+            if i == environment["commands"][-1] and all(r == 0 for r in environment["ret_vals"]):
+                await loop.run_in_executor(None, venvs.add, environment["key"], working_directory, env["path"])
+
+        # Concurrent commands share the event loop's thread: each one gets its own track
+        if tracing.enabled():
+            tracing.add(
+                "command",
+                start,
+                tracing.now(),
+                tid=tracing.track(f"command {label}"),
+                run=command["run"],
+                returncode=ret_val,
+            )
+
+        if ret_val is None:
+            logger.error(f"Command {label} '{command['run']}' timed out after {command_timeout} seconds")
+        elif ret_val != 0:
+            logger.error(f"Command {label} '{command['run']}' failed with error code {ret_val}")
+        if ret_val != 0 and stderr:
+            logger.error(stderr.decode("utf-8", errors="replace"))
+        return ret_val
+
+    for i in range(len(commands)):
+        tasks.append(asyncio.ensure_future(run(i)))
+
+    try:
+        return [await task for task in tasks]
+    finally:
+        # On error, do not leave any command behind
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def run_commands(commands, working_directory, jobs=1, timeout=None, log_folder=None, stderr_tail=None, use_cache=True):
     """
     Run the given list of commands in the given folder.
+    Independent commands (see `_dependencies`) are run concurrently.
+    The effects of the commands with a "cache" field are replayed from the cache (see `cache`) when possible,
+    and the virtual environments built by the commands with a "venv" field are cloned from the pool (see `venvs`).
     :param commands: List of commands to execute
     :param working_directory: Path to the folder where the commands should be executed
+    :param jobs: Maximum number of commands running at the same time
+    :param timeout: Default timeout of a command, in seconds (a command's "timeout" field takes precedence)
+    :param log_folder: If set, folder where to write the output of each command, relative to the working directory
+    :param stderr_tail: Number of bytes of stderr to keep for error reports (default: config.command_stderr_tail)
+    :param use_cache: Should the commands cache and the environments pool be used
     :return: 0 on success, 1 on error.
     """
-    for command in commands:
-        logger.info(f"Running command '{command}'")
-        with subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                cwd=working_directory,
-                shell=True,
-        ) as p:
-            try:
-                stdout, stderr = p.communicate()
-                logger.debug(stdout.decode("utf-8"))
-                ret_val = p.returncode
-                if ret_val != 0:
-                    logger.error(f"Commands execution failed with error code {ret_val}")
-                    logger.error(stderr)
-            except Exception as e:
-                p.kill()
-                raise e
+    commands = [_normalize_command(command) for command in commands]
+    dependencies = _dependencies(commands)
+    environments = _environments(commands, dependencies, working_directory) if use_cache else {}
+    _check_cycles(commands, dependencies)
+
+    if log_folder is not None:
+        log_folder = os.path.join(working_directory, log_folder)
+        files.mkdir(log_folder, ignore_errors=True)
+
+    _install_child_watcher()
+    loop = asyncio.new_event_loop()
+    try:
+        ret_vals = loop.run_until_complete(
+            _schedule(
+                commands,
+                dependencies,
+                working_directory,
+                jobs,
+                timeout,
+                log_folder,
+                stderr_tail,
+                use_cache,
+                environments,
+            )
+        )
+    finally:
+        loop.close()
+
+    return 0 if all(ret_val == 0 for ret_val in ret_vals) else 1
@@ -1,76 +1,239 @@
+import bisect
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from projectstarter import config
-from projectstarter.utils import logger, files, templates
+from projectstarter.commands.start import manifest, outputs
+from projectstarter.utils import bundles, catalog, logger, templates, tracing
 
 
-def _create_destination_folder(path, force=False):
+def _expand(file, template_files):
     """
-    Create a folder at the given path.
-    :param path: Path of the folder to create
-    :param force: Should the folder be removed if it already exists
+    Expand a path of the template to the files it contains.
+    :param file: Path to a file or a folder, relative to the template root
+    :param template_files: Sorted list of every file of the template
+    :returns: List of files, relative to the template root
     """
-    # Try to create the folder
-    if files.mkdir(path) is False:
-        # On fail, if not force, display an error message
-        if not force:
-            logger.error(
-                "Destination folder already exists. You can force its removal with the --force option."
-            )
-            raise Exception("Destination folder already exists")
+    i = bisect.bisect_left(template_files, file)
+    if i < len(template_files) and template_files[i] == file:
+        return [file]
 
-        # Else, remove the old folder and create a new one
-        logger.warning(f"Force option set: removing folder '{path}'")
-        files.rm(path)
+    # Every file of the folder is right after the folder path in the sorted list
+    folder = file.rstrip("/") + "/"
+    matches = []
+    for template_file in template_files[bisect.bisect_left(template_files, folder) :]:
+        if not template_file.startswith(folder):
+            break
+        matches.append(template_file)
 
-        if files.mkdir(path) is False:
-            logger.error("Something went wrong when trying to create destination folder.")
-            raise Exception("Something went wrong")
+    # A missing file is kept so that its parsing reports the error
+    return matches or [file]
 
 
-def copy_template_files(template_name, data, output_path, force=False):
+def _check_static(src, static):
+    """
+    Ensure the classification of a file copied without rendering is up to date.
+    :param src: Path of the template file
+    :param static: Description of the file from the catalog (see `catalog.static_file`)
+    :returns: The up to date description. None if the file has to be rendered.
+    """
+    if static["bundle"] is not None:
+        return static
+
+    stat = os.stat(src)
+    if [stat.st_mtime_ns, stat.st_size] == static["stamp"]:
+        return static
+
+    # The file changed since it was indexed
+    with open(src, "rb") as f:
+        content = f.read()
+    updated = catalog.static_file(content, [stat.st_mtime_ns, stat.st_size])
+    return None if updated is None else {**static, **updated}
+
+
+def _copy_file(src, dst, data, output, old_hash=None, static=None):
+    """
+    Parse a template file and write it to its destination.
+    Files which do not need to be rendered are copied as is, without being loaded.
+    :param src: Path of the template file
+    :param dst: Path of the destination file, relative to the project root
+    :param data: The data to use for Jinja2 completion
+    :param output: The project output. None for the outputs which can not be written concurrently:
+        the file is left to the caller to write, even if it did not change.
+    :param old_hash: Hash of the previously rendered content, the file is left untouched if it did not change
+    :param static: Description of the file if it can be copied without rendering (see `catalog.static_file`)
+    :returns: Tuple(hash of the rendered content, file left to write: None, ("write", content)
+        or ("copy", source, size, offset))
+    """
+    if static is not None:
+        static = _check_static(src, static)
+
+    if static is None:
+        # Parse content
+        with tracing.span("render", file=dst):
+            content = templates.parse(src, data)
+        content_hash = manifest.content_hash(content)
+        pending = ("write", content)
+    else:
+        content_hash = static["hash"]
+        if static["bundle"] is not None:
+            offset, _ = bundles.open_bundle(static["bundle"]).span(static["file"])
+            pending = ("copy", static["bundle"], static["size"], offset)
+        else:
+            pending = ("copy", src, static["size"], 0)
+
+    if output is None:
+        return content_hash, pending
+
+    if content_hash == old_hash and output.exists(dst):
+        logger.debug("Unchanged", dst)
+        return content_hash, None
+
+    logger.debug("Copying", src, "-->", dst)
+    _write(output, dst, pending)
+    return content_hash, None
+
+
+def _write(output, dst, pending):
+    """
+    Write a file to the project output.
+    :param output: The project output
+    :param dst: Path of the destination file, relative to the project root
+    :param pending: ("write", content) or ("copy", source, size, offset)
+    """
+    with tracing.span(pending[0], file=dst):
+        if pending[0] == "write":
+            output.write(dst, pending[1])
+        else:
+            output.copy(dst, *pending[1:])
+
+
+def _copy_files(paths_to_copy, data, output, jobs=1, executor="thread", old_hashes=None, static_files=None):
+    """
+    Copy every file, in parallel if more than one job is requested.
+    Files are rendered by the workers and, if the output can not be written concurrently,
+    written in order by the caller.
+    :param paths_to_copy: Dictionary of source path to destination path, relative to the project root
+    :param data: The data to use for Jinja2 completion
+    :param output: The project output
+    :param jobs: Number of parallel workers
+    :param executor: Type of workers to use, "thread" or "process"
+    :param old_hashes: Dictionary of destination path to the hash of its previously rendered content
+    :param static_files: Dictionary of source path to the description of the files copied without rendering
+    :returns: Tuple of the dictionary of destination path to the hash of its content
+        and the list of (source path, exception) for every file that failed
+    """
+    old_hashes = old_hashes or {}
+    static_files = static_files or {}
+    hashes = {}
+    errors = []
+    paths = sorted(paths_to_copy.items())
+
+    # Outputs which can not be written concurrently are not given to the workers, which may not even share them
+    worker_output = output if output.concurrent else None
+
+    def done(src, dst, result):
+        content_hash, pending = result
+        if pending is not None:
+            if content_hash == old_hashes.get(dst) and output.exists(dst):
+                logger.debug("Unchanged", dst)
+            else:
+                logger.debug("Copying", src, "-->", dst)
+                _write(output, dst, pending)
+        hashes[dst] = content_hash
+
+    if jobs <= 1:
+        for src, dst in paths:
+            try:
+                done(src, dst, _copy_file(src, dst, data, worker_output, old_hashes.get(dst), static_files.get(src)))
+            except Exception as e:
+                errors.append((src, e))
+        return hashes, errors
+
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    with pool_class(max_workers=jobs) as pool:
+        futures = [
+            (
+                src,
+                dst,
+                pool.submit(_copy_file, src, dst, data, worker_output, old_hashes.get(dst), static_files.get(src)),
+            )
+            for src, dst in paths
+        ]
+        for src, dst, future in futures:
+            try:
+                done(src, dst, future.result())
+            except Exception as e:
+                errors.append((src, e))
+    return hashes, errors
+
+
+def copy_template_files(template_name, data, output, force=False, jobs=1, executor="thread", previous_files=None):
     """
     Copy the template's files to the output folder path
     and replace its content with the provided data.
     :param template_name: The name of the template to copy from
     :param data: The data to use for Jinja2 completion
-    :param output_path: The output folder path
+    :param output: The output folder path, or an output (see `outputs`). Outputs are left open for the caller to close.
     :param force: Should the folder be removed if it already exists
+    :param jobs: Number of parallel workers used to parse and write the files
+    :param executor: Type of workers to use, "thread" (I/O bound) or "process" (CPU bound)
+    :param previous_files: If set, update the existing output folder instead of creating it.
+        Dictionary of the previously generated files (relative path to content hash):
+        unchanged files are left untouched and the files no longer selected are removed.
+    :returns: Dictionary of every generated file (relative path to content hash)
     """
-    _create_destination_folder(output_path, force)
+    if isinstance(output, str):
+        output = outputs.DirectoryOutput(output)
+        try:
+            generated_files = copy_template_files(template_name, data, output, force, jobs, executor, previous_files)
+        except BaseException:
+            output.abort()
+            raise
+        output.close()
+        return generated_files
+
+    output.prepare(force, previous_files is not None)
 
     # List files to copy over
     files_to_copy = set(data.get("files", []))
     for option, value in data.get("options", {}).items():
         files_to_copy = files_to_copy.union(set(value.get("files", [])))
-    logger.debug(f"Files to copy: {files_to_copy}")
+    logger.debug("Files to copy:", files_to_copy)
 
-    # Expand folders paths
+    # Expand folders paths, from the catalog's list of the template files
+    template_folder = os.path.join(config.templates_folder, template_name)
+    template_entry = catalog.entry(template_name)
     paths_to_copy = {}
+    static_files = {}
     for file in files_to_copy:
-        template_folder = os.path.join(config.templates_folder, template_name)
-        path = os.path.join(template_folder, file)
-        if os.path.isdir(path):
-            for path in files.all_in(path):
-                dest_path = path.replace(f"{template_folder}", output_path)
-                paths_to_copy[path] = templates.parse_string(dest_path, data).replace(
-                    ".j2", ""
-                )
-        else:
-            dest_path = path.replace(f"{template_folder}", output_path)
-            paths_to_copy[path] = templates.parse_string(dest_path, data).replace(
-                ".j2", ""
-            )
-    logger.debug(f"Paths to copy: {paths_to_copy}")
-
-    # Parse and copy files to destination
-    for src, dst in paths_to_copy.items():
-        # Retrieve destination folder
-        logger.debug("Copying", src, "-->", dst)
-        # Ensure destination folder exists
-        files.mkdir(os.path.dirname(dst), ignore_errors=True)
-        # Parse content
-        content = templates.parse(src, data)
-        # Write to file
-        with open(dst, "w") as f:
-            f.write(content)
+        for template_file in _expand(file, template_entry["files"]):
+            path = os.path.join(template_folder, template_file)
+            entry_path = template_entry["paths"].get(template_file)
+            if entry_path is None:
+                entry_path = catalog.destination(template_file)
+            destination, static_path = entry_path
+            if not static_path:
+                destination = templates.parse_string(destination, data).replace(".j2", "")
+            paths_to_copy[path] = destination
+            if template_file in template_entry["static"]:
+                static_files[path] = {
+                    **template_entry["static"][template_file],
+                    "bundle": template_entry["bundle"],
+                    "file": template_file,
+                }
+    logger.debug("Paths to copy:", paths_to_copy)
+
+    # Parse and copy files to destination, once their folders are created
+    output.makedirs(paths_to_copy.values())
+    generated_files, errors = _copy_files(paths_to_copy, data, output, jobs, executor, previous_files, static_files)
+    if len(errors) > 0:
+        for src, e in errors:
+            logger.error(f"unable to copy '{src}': {e}")
+        raise Exception(f"{len(errors)} file(s) could not be copied")
+
+    # Remove the files that are no longer part of the project
+    if previous_files is not None:
+        output.remove(set(previous_files) - set(generated_files))
+
+    return generated_files
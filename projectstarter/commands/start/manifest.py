@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+
+from projectstarter import config
+from projectstarter.utils import files, logger
+
+# Version of the manifest format
+_VERSION = 1
+
+
+def _path(output_path):
+    """
+    Get the path of the manifest of a generated project.
+    :param output_path: Path to the generated project
+    :return: Path to the manifest file
+    """
+    return os.path.join(output_path, config.manifest_name)
+
+
+def load(output_path):
+    """
+    Load the manifest of a generated project.
+    :param output_path: Path to the generated project
+    :return: Dictionary with the "files" (path to content hash) and "commands" (list of fingerprints) fields
+    """
+    try:
+        with open(_path(output_path), "r", encoding="utf8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != _VERSION:
+            raise ValueError(f"unsupported version {manifest.get('version')}")
+        return manifest
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning(f"ignoring invalid manifest '{_path(output_path)}': {e}")
+    return {"version": _VERSION, "files": {}, "commands": []}
+
+
+def save(output_path, manifest):
+    """
+    Write the manifest of a generated project.
+    :param output_path: Path to the generated project
+    :param manifest: The manifest to write
+    """
+    manifest = {**manifest, "version": _VERSION}
+    files.write_atomic(_path(output_path), json.dumps(manifest, indent=2, sort_keys=True).encode("utf8"))
+
+
+def content_hash(content):
+    """
+    Hash the content of a file.
+    :param content: String or bytes content
+    :return: Hexadecimal SHA-256 of the content
+    """
+    if isinstance(content, str):
+        content = content.encode("utf8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def command_fingerprint(command, working_directory):
+    """
+    Fingerprint a command from its definition and the content of its
+    declared inputs, so that it is only run again when one of them changes.
+    :param command: The command (string or dictionary)
+    :param working_directory: Path to the folder where the command is executed
+    :return: Hexadecimal fingerprint
+    """
+    if not isinstance(command, dict):
+        command = {"run": command}
+
+    inputs = {}
+    for path in command.get("inputs", []):
+        try:
+            with open(os.path.join(working_directory, path), "rb") as f:
+                inputs[path] = content_hash(f.read())
+        except OSError:
+            inputs[path] = None
+
+    return content_hash(json.dumps([command, inputs], sort_keys=True, default=str))
+
+
+def pending_commands(commands, working_directory, done):
+    """
+    Select the commands that have to run again.
+    :param commands: List of commands (strings or dictionaries)
+    :param working_directory: Path to the folder where the commands are executed
+    :param done: Fingerprints of the commands already run successfully
+    :return: Tuple of the list of commands to run and the list of fingerprints of every command
+    """
+    fingerprints = [command_fingerprint(command, working_directory) for command in commands]
+    pending = [command for command, fingerprint in zip(commands, fingerprints) if fingerprint not in done]
+
+    # Skipped groups are already done, the commands waiting for them do not need to
+    groups = {command.get("group") for command in pending if isinstance(command, dict)}
+    for i, command in enumerate(pending):
+        if isinstance(command, dict) and "after" in command:
+            after = command["after"] if isinstance(command["after"], list) else [command["after"]]
+            pending[i] = {**command, "after": [group for group in after if group in groups]}
+
+    return pending, fingerprints
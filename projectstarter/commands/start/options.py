@@ -4,54 +4,133 @@ from projectstarter import config
 from projectstarter.utils import logger
 
 
-def _filter_options(patterns, options_tree):
+# Characters with a special meaning in a regular expression
+_REGEX_CHARS = set(".^$*+?{}[]\\|()")
+
+
+def _merge(stats, index, nested):
     """
-    Recursive iteration on nested options. If an option matches one of
-    the given names, it is added to the list of returned options.
-    :param patterns: List of the options patterns to look for (separated with config.options_sep if nested)
+    Record the match of a pattern in the statistics of a head.
+    :param stats: List [first simple, last simple, first nested, last nested] indexes (or None)
+    :param index: Index of the pattern in its level
+    :param nested: Is the pattern nested
+    """
+    offset = 2 if nested else 0
+    if stats[offset] is None:
+        stats[offset] = index
+    stats[offset + 1] = index
+
+
+def _compile(patterns):
+    """
+    Compile the options patterns, level by level. At each nesting level, the
+    nested patterns are all moved one option forward, whichever option they matched,
+    so a level holds the same patterns for every option of the tree.
+    Each distinct pattern head is compiled once: literal heads are looked up by
+    prefix, the others are precompiled regexes.
+    :param patterns: List of the options patterns (separated with config.options_sep if nested)
+    :return: List of levels. A level is a dictionary with the "errors" (list of (pattern, re.error)),
+        "literals" (dictionary of head to statistics, see `_merge`), "regexes"
+        (list of (compiled head, statistics)) and "max_literal" fields.
+    """
+    levels = []
+    while len(patterns) > 0:
+        level = {"errors": [], "literals": {}, "regexes": {}, "max_literal": 0}
+        for i, pattern in enumerate(patterns):
+            head = pattern.split(config.options_sep, 1)[0]
+            nested = config.options_sep in pattern
+            if not _REGEX_CHARS.intersection(head):
+                # re.match of a literal is a prefix check
+                _merge(level["literals"].setdefault(head, [None] * 4), i, nested)
+                level["max_literal"] = max(level["max_literal"], len(head))
+                continue
+            if head not in level["regexes"]:
+                try:
+                    level["regexes"][head] = (re.compile(head), [None] * 4)
+                except re.error as e:
+                    level["errors"].append((pattern, e))
+                    continue
+            _merge(level["regexes"][head][1], i, nested)
+        level["regexes"] = list(level["regexes"].values())
+        levels.append(level)
+        patterns = [p.split(config.options_sep, 1)[1] for p in patterns if config.options_sep in p]
+    return levels
+
+
+def _match(level, name):
+    """
+    Match an option name against every pattern of a level.
+    :param level: The compiled level (see `_compile`)
+    :param name: Name of the option
+    :return: List [first simple, last simple, first nested, last nested] indexes of the matching patterns
+    """
+    matched = []
+    literals = level["literals"]
+    for length in range(min(len(name), level["max_literal"]) + 1):
+        stats = literals.get(name[:length])
+        if stats is not None:
+            matched.append(stats)
+    for regex, stats in level["regexes"]:
+        if regex.match(name) is not None:
+            matched.append(stats)
+
+    result = [None] * 4
+    for stats in matched:
+        for i, index in enumerate(stats):
+            if index is None:
+                continue
+            if result[i] is None or (index < result[i] if i % 2 == 0 else index > result[i]):
+                result[i] = index
+    return result
+
+
+def _filter_options(levels, depth, options_tree):
+    """
+    Iteration on nested options. If an option matches one of
+    the given patterns, it is added to the list of returned options.
+    :param levels: The compiled patterns (see `_compile`)
+    :param depth: Nesting level of the options tree
     :param options_tree: The options dictionary tree
-    :return: Dictionary of key/value options that matched the given names. None on error.
+    :return: Dictionary of key/value options that matched the given patterns. None on error.
     """
     # Stop recursion
-    if len(patterns) == 0:
+    if depth >= len(levels):
         return {}
 
+    level = levels[depth]
+    options_names = options_tree.get("options", {})
+    if len(options_names) > 0 and len(level["errors"]) > 0:
+        pattern, e = level["errors"][0]
+        logger.error(f"option pattern '{pattern}' is invalid: {e}")
+        return None
+
     options = {}
 
     # For each option
-    for name, value in options_tree.get("options", {}).items():
-        # For each pattern
-        for pattern in patterns:
-            try:
-                if config.options_sep not in pattern:
-                    # Handle simple option
-                    if re.match(pattern, name):
-                        # No need for nested options on match
-                        if "options" in value.keys():
-                            value.pop("options")
-                        # Add option in options list
-                        options[name] = value
-                else:
-                    # Handle nested option
-                    if re.match(pattern.split(config.options_sep)[0], name):
-                        # Move patterns one option forward
-                        new_patterns = [
-                            re.sub(r"^.*?" + config.options_sep, "", p)
-                            for p in patterns
-                            if config.options_sep in p
-                        ]
-                        # Get nested options
-                        new_options = _filter_options(new_patterns, value)
-                        if new_options is None:
-                            return None
-                        # Ensure the key exists
-                        options[name] = options.setdefault(name, value)
-                        # Set the new options
-                        options[name]["options"] = new_options
-            except re.error as e:
-                logger.error(f"option pattern '{pattern}' is invalid: {e}")
+    for name, value in options_names.items():
+        first_simple, last_simple, first_nested, last_nested = _match(level, name)
+        if first_simple is None and first_nested is None:
+            continue
+
+        # Get nested options, unless a simple match already dropped them
+        new_options = {}
+        if first_nested is not None and (first_simple is None or first_nested < first_simple):
+            new_options = _filter_options(levels, depth + 1, value)
+            if new_options is None:
                 return None
 
+        # Add option in options list
+        options[name] = value
+        if last_nested is None or (last_simple is not None and last_simple > last_nested):
+            # No need for nested options on simple match
+            value.pop("options", None)
+        elif first_simple is not None:
+            # Nested options dropped by a previous simple match
+            value["options"] = {}
+        else:
+            # Set the new options
+            value["options"] = new_options
+
     return options
 
 
@@ -68,8 +147,10 @@ def filter_options(patterns, options_tree):
         # Retrieve all
         filtered_options = options_tree.get("options", {})
     else:
-        # Retrieve partial
-        filtered_options = _filter_options(patterns, options_tree)
+        # Retrieve partial, with the patterns compiled once for the whole tree
+        filtered_options = _filter_options(_compile(patterns), 0, options_tree)
+        if filtered_options is None:
+            return None
 
     # Display unmatched options
     pattern_has_not_matched = False
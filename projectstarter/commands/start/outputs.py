@@ -0,0 +1,392 @@
+import abc
+import io
+import itertools
+import os
+import re
+import socket
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+
+from projectstarter.utils import files, logger
+
+# Archive formats, by file extension
+ARCHIVE_FORMATS = {".tar": "tar", ".tar.gz": "tar.gz", ".tgz": "tar.gz", ".zip": "zip"}
+
+# Permissions of the generated files
+_FILE_MODE = 0o644
+
+# Number of seconds after which a staging folder is considered abandoned, whatever the machine writing it
+_STAGING_AGE = 24 * 3600
+
+
+def _hostname():
+    """
+    Get the name of the current machine, as it appears in the staging folders names.
+    :returns: The host name
+    """
+    return re.sub(r"[^\w.-]", "_", socket.gethostname())
+
+
+def _process_alive(pid):
+    """
+    Check if a process is running.
+    :param pid: Identifier of the process
+    :returns: True if the process exists
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, but belongs to another user
+        return True
+    return True
+
+
+def _remove_stale_staging(parent, name):
+    """
+    Remove the staging folders of a destination left by processes which died
+    before moving them (e.g. killed while rendering the project). The parent folder
+    can be shared with other machines: only the processes of the current one are checked,
+    the staging folders of the others are removed once abandoned for long enough.
+    :param parent: Path of the folder containing the destination
+    :param name: Name of the destination
+    """
+    pattern = re.compile(rf"\.{re.escape(name)}\.staging-(.+)-(\d+)-\d+(\.old)?")
+    try:
+        names = os.listdir(parent)
+    except OSError:
+        return
+    host = _hostname()
+    for entry in names:
+        match = pattern.fullmatch(entry)
+        if match is None:
+            continue
+        path = os.path.join(parent, entry)
+        pid = int(match.group(2))
+        if match.group(1) == host and pid != os.getpid() and not _process_alive(pid):
+            stale = True
+        else:
+            # The process may run on another machine, or its identifier may have been reused
+            try:
+                stale = time.time() - os.stat(path).st_mtime > _STAGING_AGE
+            except OSError:
+                continue
+        if stale:
+            logger.debug("Removing stale staging folder", entry)
+            files.rm_background(path)
+
+
+class Output(abc.ABC):
+    """
+    Destination of a generated project. Paths are relative to the project root,
+    with '/' separators.
+    """
+
+    # Root folder of the project, where its commands run. None if the project is not written to a folder.
+    path = None
+
+    # Can files be written by several workers (threads or processes) at the same time
+    concurrent = False
+
+    def prepare(self, force=False, update=False):
+        """
+        Get the output ready to receive the files.
+        :param force: Should the existing project be removed
+        :param update: Is an existing project updated
+        """
+
+    def makedirs(self, paths):
+        """
+        Create the folders of the files about to be written, at once.
+        :param paths: List of paths of the files
+        """
+
+    def exists(self, path):
+        """
+        Check if a file was generated by a previous run.
+        :param path: Path of the file
+        :returns: True if the file exists
+        """
+        return False
+
+    @abc.abstractmethod
+    def write(self, path, content):
+        """
+        Write a rendered file.
+        :param path: Path of the file
+        :param content: Content of the file (string)
+        """
+
+    @abc.abstractmethod
+    def copy(self, path, src, size, offset=0):
+        """
+        Write a file copied from a range of another file.
+        :param path: Path of the file
+        :param src: Path of the file to copy from
+        :param size: Number of bytes to copy
+        :param offset: Position of the first byte to copy in the source file
+        """
+
+    def remove(self, paths):
+        """
+        Remove files generated by a previous run.
+        :param paths: List of paths
+        """
+
+    def close(self):
+        """
+        Flush and close the output, once every file is written.
+        """
+
+    def abort(self):
+        """
+        Close the output after a failure. Nothing should be left half written.
+        """
+        self.close()
+
+
+class DirectoryOutput(Output):
+    """
+    Project written to a folder.
+    New projects are written to a staging folder next to the destination, which
+    replaces the destination once complete. Updated projects are written in place.
+    """
+
+    concurrent = True
+
+    def __init__(self, path):
+        self.path = path
+        self._root = path
+        self._staging = None
+        self._force = False
+        self._folders = set()
+
+    def prepare(self, force=False, update=False):
+        if update:
+            files.mkdir(self.path, ignore_errors=True)
+            return
+
+        if os.path.exists(self.path):
+            logger.warning(f"Folder '{self.path}' already exists.")
+            # On fail, if not force, display an error message
+            if not force:
+                logger.error("Destination folder already exists. You can force its removal with the --force option.")
+                raise Exception("Destination folder already exists")
+            logger.warning(f"Force option set: removing folder '{self.path}'")
+        self._force = force
+
+        # Create the staging folder, on the same filesystem as the destination
+        parent, name = os.path.split(os.path.abspath(self.path))
+        files.mkdir(parent, ignore_errors=True)
+        _remove_stale_staging(parent, name)
+        for i in itertools.count():
+            staging = os.path.join(parent, f".{name}.staging-{_hostname()}-{os.getpid()}-{i}")
+            try:
+                os.mkdir(staging)
+                break
+            except FileExistsError:
+                continue
+        self._staging = staging
+        self._root = staging
+
+    def makedirs(self, paths):
+        folders = {os.path.dirname(path) for path in paths} - {""}
+        # Creating the deepest folders creates their parents
+        for folder in sorted(folders, reverse=True):
+            if folder not in self._folders:
+                os.makedirs(os.path.join(self._root, folder), exist_ok=True)
+                while folder and folder not in self._folders:
+                    self._folders.add(folder)
+                    folder = os.path.dirname(folder)
+
+    def exists(self, path):
+        return os.path.isfile(os.path.join(self._root, path))
+
+    def _destination(self, path):
+        """
+        Get the path a file is written to, creating its folder if needed.
+        :param path: Path of the file, relative to the project root
+        :returns: Path of the file
+        """
+        folder = os.path.dirname(path)
+        path = os.path.join(self._root, path)
+        if folder and folder not in self._folders:
+            # Ensure destination folder exists
+            files.mkdir(os.path.dirname(path), ignore_errors=True)
+        return path
+
+    def write(self, path, content):
+        with open(self._destination(path), "w") as f:
+            f.write(content)
+
+    def copy(self, path, src, size, offset=0):
+        files.copy_range(src, self._destination(path), size, offset)
+
+    def remove(self, paths):
+        for path in sorted(paths):
+            logger.debug("Removing", path)
+            path = os.path.join(self._root, path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            try:
+                os.removedirs(os.path.dirname(path))
+            except OSError:
+                # The folder is not empty (or is the project root)
+                pass
+
+    def close(self):
+        """
+        Move the staging folder to the destination. An existing destination
+        is swapped atomically when the system supports it, and removed in the background.
+        """
+        if self._staging is None:
+            return
+        staging, self._staging = self._staging, None
+        self._root = self.path
+
+        if not os.path.exists(self.path):
+            os.rename(staging, self.path)
+            return
+        if not self._force:
+            files.rm_background(staging)
+            raise Exception("Destination folder already exists")
+
+        # The staging folder gets the old project
+        if not files.exchange(staging, self.path):
+            old = staging + ".old"
+            os.rename(self.path, old)
+            os.rename(staging, self.path)
+            staging = old
+        files.rm_background(staging)
+
+    def abort(self):
+        if self._staging is not None:
+            files.rm_background(self._staging)
+            self._staging = None
+            self._root = self.path
+
+
+class MemoryOutput(Output):
+    """
+    Project kept in memory, for tests and previews.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def write(self, path, content):
+        self.files[path] = content.encode("utf8")
+
+    def copy(self, path, src, size, offset=0):
+        with open(src, "rb") as f:
+            f.seek(offset)
+            self.files[path] = f.read(size)
+
+
+class ArchiveOutput(Output):
+    """
+    Project streamed to a tar or zip archive, every file under a folder named after the project.
+    The files are written one at a time, in order, without creating any folder.
+    """
+
+    def __init__(self, target, archive_format, prefix):
+        """
+        :param target: Path of the archive, "-" for the standard output
+        :param archive_format: "tar", "tar.gz" or "zip"
+        :param prefix: Name of the root folder in the archive
+        """
+        self.target = target
+        self.format = archive_format
+        self.prefix = prefix.strip("/") + "/" if prefix else ""
+        self._stream = None
+        self._archive = None
+        self._mtime = time.time()
+        self._lock = threading.Lock()
+
+    def prepare(self, force=False, update=False):
+        if self.target == "-":
+            self._stream = sys.stdout.buffer
+        else:
+            if os.path.exists(self.target) and not force:
+                logger.error("Destination archive already exists. You can overwrite it with the --force option.")
+                raise Exception("Destination archive already exists")
+            self._stream = open(self.target, "wb")
+
+        if self.format == "zip":
+            self._archive = zipfile.ZipFile(self._stream, "w", zipfile.ZIP_DEFLATED)
+        else:
+            # Stream mode: the archive is written sequentially, without seeking
+            self._archive = tarfile.open(fileobj=self._stream, mode="w|gz" if self.format == "tar.gz" else "w|")
+
+    def _add(self, path, fileobj, size):
+        """
+        Add a file to the archive.
+        :param path: Path of the file
+        :param fileobj: File object to read the content from, from its current position
+        :param size: Number of bytes to read
+        """
+        name = self.prefix + path
+        with self._lock:
+            if self.format == "zip":
+                info = zipfile.ZipInfo(name, time.localtime(self._mtime)[:6])
+                info.external_attr = (0o100000 | _FILE_MODE) << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.file_size = size
+                with self._archive.open(info, "w") as f:
+                    remaining = size
+                    while remaining > 0:
+                        chunk = fileobj.read(min(remaining, 1024 * 1024))
+                        if not chunk:
+                            raise EOFError(f"unexpected end of file for '{path}'")
+                        f.write(chunk)
+                        remaining -= len(chunk)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mtime = self._mtime
+                info.mode = _FILE_MODE
+                self._archive.addfile(info, fileobj)
+
+    def write(self, path, content):
+        content = content.encode("utf8")
+        self._add(path, io.BytesIO(content), len(content))
+
+    def copy(self, path, src, size, offset=0):
+        with open(src, "rb") as f:
+            f.seek(offset)
+            self._add(path, f, size)
+
+    def abort(self):
+        self.close()
+        if self.target != "-":
+            files.rm(self.target)
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        if self._stream is not None:
+            if self._stream is sys.stdout.buffer:
+                self._stream.flush()
+            else:
+                self._stream.close()
+            self._stream = None
+
+
+def archive_format(path, default="tar"):
+    """
+    Guess the format of an archive from its extension.
+    :param path: Path of the archive
+    :param default: Format to use when the extension is unknown
+    :returns: "tar", "tar.gz" or "zip"
+    """
+    for extension, archive_format in ARCHIVE_FORMATS.items():
+        if path.endswith(extension):
+            return archive_format
+    return default
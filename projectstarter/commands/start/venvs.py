@@ -0,0 +1,225 @@
+import json
+import os
+import tempfile
+import time
+
+from projectstarter import config
+from projectstarter.commands.start import manifest
+from projectstarter.utils import files, logger
+
+# Version of the pooled environments format
+_VERSION = 1
+
+# Name of the file describing a pooled environment
+_INFO = "pool.json"
+
+# Number of seconds after which an unfinished staging folder is considered abandoned
+_STAGING_AGE = 24 * 3600
+
+
+def _folder():
+    """
+    Get the folder of the environments pool.
+    :returns: Path to the folder
+    """
+    return os.path.join(config.cache_folder, "venvs")
+
+
+def environment(command):
+    """
+    Get the environment a command builds, from its "venv" field.
+    :param command: Normalized command
+    :returns: Dictionary with the "path", "python" and "requirements" fields. None if the command has no "venv" field.
+    """
+    venv = command.get("venv")
+    if not venv:
+        return None
+    if not isinstance(venv, dict):
+        venv = {"path": venv}
+    return {
+        "path": str(venv.get("path", "venv")),
+        "python": venv.get("python"),
+        "requirements": venv.get("requirements"),
+    }
+
+
+def key(env, runs, working_directory):
+    """
+    Get the pool key of an environment: it changes with the interpreter, the requirements
+    and the commands building the environment.
+    :param env: The environment (see `environment`)
+    :param runs: List of the commands building the environment
+    :param working_directory: Path to the folder where the commands are executed
+    :returns: Hexadecimal key
+    """
+    interpreter = None
+    if env["python"]:
+        try:
+            st = os.stat(env["python"])
+            interpreter = [os.path.realpath(env["python"]), st.st_size, st.st_mtime_ns]
+        except OSError:
+            interpreter = [env["python"]]
+
+    requirements = None
+    if env["requirements"]:
+        try:
+            with open(os.path.join(working_directory, env["requirements"]), "rb") as f:
+                requirements = manifest.content_hash(f.read())
+        except OSError:
+            pass
+
+    return manifest.content_hash(json.dumps([_VERSION, env["path"], interpreter, requirements, runs]))
+
+
+def _copy_tree(src, dst, hardlink=False, origin=None, target=None, relocate=()):
+    """
+    Copy a folder, sharing the files content with the source when possible (see `files.clone`).
+    :param src: Path of the folder to copy
+    :param dst: Path of the copy, which must not exist
+    :param hardlink: Can the files be hard linked to the source
+    :param origin: If set, path replaced by `target` in the relocated files and in the symbolic links targets
+    :param target: Path replacing `origin`
+    :param relocate: Set of the files (relative to the folder, with '/' separators) in which `origin` is replaced
+    """
+    os.mkdir(dst)
+    pattern = files.path_pattern(origin) if origin is not None else None
+    folders = [""]
+    while folders:
+        relative_folder = folders.pop()
+        with os.scandir(os.path.join(src, relative_folder)) as it:
+            entries = list(it)
+        for entry in entries:
+            path = f"{relative_folder}/{entry.name}" if relative_folder else entry.name
+            destination = os.path.join(dst, path)
+            if entry.is_symlink():
+                link = os.readlink(entry.path)
+                if origin is not None and (link == origin or link.startswith(origin + os.sep)):
+                    link = target + link[len(origin) :]
+                os.symlink(link, destination)
+            elif entry.is_dir():
+                os.mkdir(destination)
+                folders.append(path)
+            elif path in relocate:
+                with open(entry.path, "rb") as f:
+                    content = pattern.sub(lambda m: os.fsencode(target), f.read())
+                with open(destination, "wb") as f:
+                    f.write(content)
+                os.chmod(destination, entry.stat().st_mode & 0o7777)
+            else:
+                files.clone(entry.path, destination, hardlink)
+
+
+def _references(folder, path):
+    """
+    List the text files of a folder which contain a path.
+    :param folder: Path of the folder
+    :param path: The path to look for
+    :returns: List of files, relative to the folder with '/' separators
+    """
+    pattern = files.path_pattern(path)
+    matches = []
+    for relative_path, entry in files.walk(folder, exclude=["__pycache__"]):
+        if entry.is_symlink() or not entry.is_file():
+            continue
+        with open(entry.path, "rb") as f:
+            content = f.read()
+        if pattern.search(content) and b"\0" not in content:
+            matches.append(relative_path)
+    return matches
+
+
+def add(key, working_directory, path):
+    """
+    Add an environment built in a project to the pool. Errors are reported as warnings: the pool is an optimization.
+    :param key: The environment's pool key (see `key`)
+    :param working_directory: Path to the project
+    :param path: Path of the environment, relative to the project
+    """
+    pooled = os.path.join(_folder(), key)
+    if os.path.exists(pooled):
+        return
+
+    staging = None
+    try:
+        os.makedirs(_folder(), exist_ok=True)
+        staging = tempfile.mkdtemp(dir=_folder(), prefix=".staging-")
+        env = os.path.join(staging, "env")
+        # The pool keeps its own copy: the project's environment can change afterwards
+        _copy_tree(os.path.join(working_directory, path), env)
+        info = {"version": _VERSION, "origin": working_directory, "relocate": _references(env, working_directory)}
+        with open(os.path.join(staging, _INFO), "w", encoding="utf8") as f:
+            json.dump(info, f)
+        os.rename(staging, pooled)
+        staging = None
+        logger.debug("environment added to the pool:", pooled)
+    except OSError as e:
+        logger.warning(f"unable to add the environment '{path}' to the pool: {e}")
+    finally:
+        if staging is not None:
+            files.rm(staging)
+    evict()
+
+
+def clone(key, working_directory, path):
+    """
+    Clone a pooled environment into a project, and relocate it.
+    :param key: The environment's pool key (see `key`)
+    :param working_directory: Path to the project
+    :param path: Path of the environment, relative to the project
+    :returns: True if the environment was cloned. False if it is not in the pool.
+    """
+    pooled = os.path.join(_folder(), key)
+    destination = os.path.join(working_directory, path)
+    try:
+        with open(os.path.join(pooled, _INFO), "r", encoding="utf8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if info.get("version") != _VERSION or os.path.lexists(destination):
+        return False
+
+    try:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        _copy_tree(
+            os.path.join(pooled, "env"),
+            destination,
+            config.venv_pool_hardlinks,
+            info["origin"],
+            working_directory,
+            set(info["relocate"]),
+        )
+        # Mark the environment as recently used
+        os.utime(os.path.join(pooled, _INFO))
+    except OSError as e:
+        logger.warning(f"unable to clone the environment '{path}' from the pool: {e}")
+        files.rm(destination)
+        return False
+    return True
+
+
+def evict(max_count=None):
+    """
+    Remove the least recently used environments of the pool, and the abandoned staging folders.
+    :param max_count: Maximum number of environments to keep (default: config.venv_pool_size)
+    """
+    max_count = config.venv_pool_size if max_count is None else max_count
+    try:
+        names = os.listdir(_folder())
+    except FileNotFoundError:
+        return
+
+    pooled = []
+    for name in names:
+        path = os.path.join(_folder(), name)
+        try:
+            if name.startswith(".staging-"):
+                if time.time() - os.stat(path).st_mtime > _STAGING_AGE:
+                    files.rm(path)
+                continue
+            pooled.append((os.stat(os.path.join(path, _INFO)).st_mtime, path))
+        except OSError:
+            continue
+
+    for _, path in sorted(pooled, reverse=True)[max_count:]:
+        logger.debug("evicting pooled environment", path)
+        files.rm(path)
@@ -4,8 +4,7 @@ List all the available templates
 import argparse
 import re
 
-from projectstarter.utils import templates as tmplts
-from projectstarter.utils import logger
+from projectstarter.utils import logger, search
 
 
 def run(args):
@@ -13,26 +12,34 @@ def run(args):
     Run the command.
     :param args: Arguments given to the command
     """
-    templates = tmplts.all()
+    templates = search.documents()
 
     if len(templates) == 0:
         logger.info("No templates found.")
         return 1
 
-    max_template_name_len = max(len(name) for name in templates.keys()) + 4
+    max_template_name_len = max(len(template["name"]) for template in templates) + 4
 
-    logger.info("The available templates are:")
-    for name, data in templates.items():
-        description = data.get("description", "").lower().strip()
+    # Apply filter on the name or description
+    if args.filter:
+        pattern = re.compile(args.filter)
+        templates = [t for t in templates if pattern.match(t["name"]) or pattern.match(t["description"])]
 
-        # Apply search filter
-        if args.filter and not (
-            re.match(args.filter, name) or re.match(args.filter, description)
-        ):
-            continue
+    # Search the templates, best matches first
+    if args.search:
+        offset = (args.page - 1) * args.limit if args.limit is not None else 0
+        templates = list(search.search(args.search, offset, args.limit))
 
-        name_log = name.ljust(max_template_name_len)
-        description_log = description or "-"
+    if len(templates) == 0:
+        logger.info("No templates found.")
+        return 1
+
+    logger.info("The available templates are:")
+    for template in templates:
+        name_log = template["name"].ljust(max_template_name_len)
+        description_log = template["description"] or "-"
+        if template.get("options"):
+            description_log += f" (options: {', '.join(template['options'])})"
         logger.info(f"{name_log}{description_log}", prefix="  ")
 
 
@@ -43,10 +50,46 @@ def parse(prog, args):
     :param args: Arguments given to the command
     """
     parser = argparse.ArgumentParser(prog=prog, description=__doc__)
-    parser.add_argument(
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument(
         "-f",
         "--filter",
         metavar="PATTERN",
         help="filter templates based on pattern matching name or description",
     )
-    return parser.parse_args(args)
+    query.add_argument(
+        "-s",
+        "--search",
+        metavar="QUERY",
+        help=(
+            "search templates by name, description, option names and option descriptions "
+            "(approximate matches are accepted)"
+        ),
+    )
+    parser.add_argument(
+        "-l",
+        "--limit",
+        metavar="N",
+        type=int,
+        default=None,
+        help="maximum number of search results to display",
+    )
+    parser.add_argument(
+        "-p",
+        "--page",
+        metavar="N",
+        type=int,
+        default=1,
+        help="page of search results to display, with --limit (default: 1)",
+    )
+    args = parser.parse_args(args)
+
+    if args.page < 1 or (args.limit is not None and args.limit < 1):
+        parser.error("the page and limit arguments should be positive")
+    if args.filter:
+        try:
+            re.compile(args.filter)
+        except re.error as e:
+            parser.error(f"invalid filter pattern: {e}")
+
+    return args
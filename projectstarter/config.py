@@ -1,7 +1,42 @@
-import pkg_resources
+import os
 
 # Path to the templates folder
-templates_folder = pkg_resources.resource_filename("projectstarter", "templates")
+templates_folder = os.environ.get("PROJECTSTARTER_TEMPLATES") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "templates"
+)
+
+# Path to the cache folder (compiled templates, indexes, ...)
+cache_folder = os.environ.get("PROJECTSTARTER_CACHE") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "projectstarter"
+)
+
+# Path to the socket of the daemon (see `project serve`)
+socket_path = os.environ.get("PROJECTSTARTER_SOCKET") or os.path.join(cache_folder, "daemon.sock")
+
+# Maximum number of compiled templates files kept in memory
+jinja_cache_size = 4096
+
+# Maximum number of compiled strings (paths, commands, ...) kept in memory
+string_cache_size = 1024
+
+# Number of bytes of a command's stderr kept for error reports
+command_stderr_tail = 64 * 1024
+
+# Maximum size of the contents stored by the commands cache, in bytes
+command_cache_size = 1024 * 1024 * 1024
+
+# Number of seconds after which an unused commands cache entry is evicted
+command_cache_age = 30 * 24 * 3600
+
+# Maximum number of pre-built virtual environments kept in the pool
+venv_pool_size = 8
+
+# Can the files of the pooled virtual environments be hard linked into the projects, when the filesystem
+# does not support cloning them. Editing a hard linked file in place changes the pool and every clone.
+venv_pool_hardlinks = False
+
+# Name of the manifest written in the projects generated with --update
+manifest_name = ".projectstarter.json"
 
 # Separator used between each nested option
 options_sep = ":"
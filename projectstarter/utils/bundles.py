@@ -0,0 +1,136 @@
+import json
+import mmap
+import os
+import struct
+
+from projectstarter.utils import files
+
+# Bundle format:
+#   MAGIC | header size (little endian u64) | header (JSON) | files content
+# The header holds the template's metadata and the manifest of its files,
+# mapping each file path to its [offset, size] in the content section.
+MAGIC = b"PROJECTSTARTER-BUNDLE-1\n"
+EXTENSION = ".bundle"
+
+_HEADER_SIZE = struct.Struct("<Q")
+
+# Opened bundles: path -> (stamp, Bundle)
+_opened = {}
+
+
+class Bundle:
+    """
+    Template bundle, memory-mapped so that files are read without copies
+    to intermediate buffers nor extraction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header, self._data_offset = _read_header(self._mmap)
+        self.metadata = header["metadata"]
+        self.manifest = header["manifest"]
+
+    def files(self):
+        """
+        Get the paths of the files of the bundle.
+        :returns: Sorted list of paths, relative to the template root
+        """
+        return sorted(self.manifest.keys())
+
+    def read(self, file_path):
+        """
+        Read a file of the bundle.
+        :param file_path: Path of the file, relative to the template root
+        :returns: Content of the file as bytes
+        """
+        start, size = self.span(file_path)
+        return self._mmap[start : start + size]
+
+    def span(self, file_path):
+        """
+        Locate a file in the bundle.
+        :param file_path: Path of the file, relative to the template root
+        :returns: Tuple(offset of the file content in the bundle, size of the file)
+        """
+        offset, size = self.manifest[file_path]
+        return self._data_offset + offset, size
+
+
+def _read_header(buffer):
+    """
+    Parse the header of a bundle.
+    :param buffer: Bytes-like object starting with the bundle content
+    :returns: Tuple(header dictionary, offset of the files content)
+    """
+    if buffer[: len(MAGIC)] != MAGIC:
+        raise ValueError("not a template bundle")
+    start = len(MAGIC) + _HEADER_SIZE.size
+    (header_size,) = _HEADER_SIZE.unpack(buffer[len(MAGIC) : start])
+    header = json.loads(bytes(buffer[start : start + header_size]).decode("utf8"))
+    return header, start + header_size
+
+
+def read_header(path):
+    """
+    Read the header of a bundle without mapping the whole file.
+    :param path: Path to the bundle
+    :returns: Dictionary with the "metadata" and "manifest" fields
+    """
+    with open(path, "rb") as f:
+        start = f.read(len(MAGIC) + _HEADER_SIZE.size)
+        if len(start) < len(MAGIC) + _HEADER_SIZE.size:
+            raise ValueError("not a template bundle")
+        (header_size,) = _HEADER_SIZE.unpack(start[len(MAGIC) :])
+        return _read_header(start + f.read(header_size))[0]
+
+
+def stamp(path):
+    """
+    Get the modification time and size of a bundle.
+    :param path: Path to the bundle
+    :returns: List [mtime, size]. None if the bundle does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def open_bundle(path):
+    """
+    Open a bundle. Bundles stay opened for the session and are reopened
+    when the file changes.
+    :param path: Path to the bundle
+    :returns: The bundle
+    """
+    bundle_stamp = stamp(path)
+    if bundle_stamp is None:
+        raise FileNotFoundError(path)
+    if path not in _opened or _opened[path][0] != bundle_stamp:
+        _opened[path] = (bundle_stamp, Bundle(path))
+    return _opened[path][1]
+
+
+def build(template_folder, metadata, file_paths, output_path):
+    """
+    Pack a template into a bundle.
+    :param template_folder: Path to the template folder
+    :param metadata: The template's metadata
+    :param file_paths: Paths of the files to pack, relative to the template folder
+    :param output_path: Path of the bundle to write
+    """
+    manifest = {}
+    contents = []
+    offset = 0
+    for file_path in file_paths:
+        with open(os.path.join(template_folder, file_path), "rb") as f:
+            content = f.read()
+        manifest[file_path] = [offset, len(content)]
+        contents.append(content)
+        offset += len(content)
+
+    header = json.dumps({"metadata": metadata, "manifest": manifest}).encode("utf8")
+    files.write_atomic(output_path, b"".join([MAGIC, _HEADER_SIZE.pack(len(header)), header] + contents))
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from projectstarter import config
+from projectstarter.utils import bundles, files, io, logger
+
+# Version of the index format, to increase whenever the entries change
+_VERSION = 5
+
+# Jinja delimiters: a file without any of them renders to its own content
+_JINJA_DELIMITERS = (b"{{", b"{%", b"{#")
+
+# In-memory catalog index and names of the templates validated in this session
+_index = None
+_validated = set()
+
+# Lock protecting the in-memory index from concurrent updates
+_lock = threading.RLock()
+
+
+def _index_path():
+    """
+    Get the path of the catalog index file.
+    :returns: Path to the index file
+    """
+    return os.path.join(config.cache_folder, "catalog.json")
+
+
+def _load():
+    """
+    Load the catalog index from disk, or create an empty one.
+    :returns: The catalog index
+    """
+    global _index
+    if _index is None:
+        try:
+            with open(_index_path(), "r", encoding="utf8") as f:
+                _index = json.load(f)
+            if _index.get("version") != _VERSION:
+                raise ValueError(f"unsupported version {_index.get('version')}")
+        except (OSError, ValueError) as e:
+            logger.debug(f"catalog index not loaded: {e}")
+            _index = {"version": _VERSION, "templates": {}}
+    return _index
+
+
+def _save():
+    """
+    Write the catalog index to disk. The file is replaced atomically so
+    that concurrent processes never read a partial index.
+    The metadata of the template folders is not written: Yaml values (integer keys, dates, ...)
+    do not survive JSON, it is loaded again through its compiled version (see `io.yaml_load_compiled`).
+    """
+    path = _index_path()
+    templates = {}
+    for name, template_entry in _index["templates"].items():
+        if template_entry["bundle"] is None:
+            template_entry = {key: value for key, value in template_entry.items() if key != "metadata"}
+        templates[name] = template_entry
+    index = {"version": _index["version"], "templates": templates}
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        files.write_atomic(path, json.dumps(index).encode("utf8"))
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"catalog index not saved: {e}")
+
+
+def _metadata_stamp(template_folder):
+    """
+    Get the modification time and size of a template's metadata file.
+    :param template_folder: Path to the template folder
+    :returns: List [mtime, size]. None if the file does not exist.
+    """
+    try:
+        stat = os.stat(os.path.join(template_folder, "metadata.yml"))
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _is_fresh(template_folder, stamp):
+    """
+    Check if the stamp of a template entry still matches the files.
+    The metadata file is compared on modification time and size, and every
+    folder on modification time (which changes when files are added or removed).
+    :param template_folder: Path to the template folder
+    :param stamp: The stamp of the entry
+    :returns: True if the entry is up to date
+    """
+    if "folders" not in stamp:
+        return False
+    if _metadata_stamp(template_folder) != stamp["metadata"]:
+        return False
+    for folder, mtime in stamp["folders"].items():
+        try:
+            if os.stat(os.path.join(template_folder, folder)).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def classify(content):
+    """
+    Classify the content of a template file.
+    :param content: Content of the file as bytes
+    :returns: "binary" for non text files, "raw" for text files rendering
+        to their own content and "template" for the files to render
+    """
+    if b"\0" in content:
+        return "binary"
+    try:
+        content.decode("utf8")
+    except UnicodeDecodeError:
+        return "binary"
+    # Jinja normalizes the newlines of the files it renders
+    if b"\r" in content or any(delimiter in content for delimiter in _JINJA_DELIMITERS):
+        return "template"
+    return "raw"
+
+
+def static_file(content, stamp=None):
+    """
+    Describe a file copied as is, without rendering.
+    :param content: Content of the file as bytes
+    :param stamp: List [mtime, size] of the file. None for bundled files.
+    :returns: Dictionary with the "kind", "size" (number of bytes to copy),
+        "hash" (of the copied content) and "stamp" fields. None if the file has to be rendered.
+    """
+    kind = classify(content)
+    if kind == "template":
+        return None
+    # Jinja drops the trailing newline of the files it renders
+    if kind == "raw" and content.endswith(b"\n"):
+        content = content[:-1]
+    return {
+        "kind": kind,
+        "size": len(content),
+        "hash": hashlib.sha256(content).hexdigest(),
+        "stamp": stamp,
+    }
+
+
+def destination(path):
+    """
+    Compile the destination path of a template file.
+    :param path: Path of the file, relative to the template root
+    :returns: List [destination, static]. Static destinations are final, the others
+        are Jinja strings to render then to strip of their ".j2" extensions.
+    """
+    if any(delimiter.decode("utf8") in path for delimiter in _JINJA_DELIMITERS):
+        return [path, False]
+    return [path.replace(".j2", ""), True]
+
+
+def _build_entry(name, template_folder):
+    """
+    Build the catalog entry of a template.
+    :param name: Name of the template
+    :param template_folder: Path to the template folder
+    :returns: The catalog entry
+    """
+    logger.debug(f"indexing template '{name}'")
+    template_metadata = io.yaml_load_compiled(os.path.join(template_folder, "metadata.yml"))
+    include = (template_metadata or {}).get("include")
+    exclude = ["/metadata.yml"] + (template_metadata or {}).get("exclude", [])
+
+    stamp = {
+        "metadata": _metadata_stamp(template_folder),
+        "folders": {".": os.stat(template_folder).st_mtime_ns},
+    }
+    template_files = []
+    static_files = {}
+    for path, dir_entry in files.walk(template_folder, include, exclude):
+        file_stat = dir_entry.stat()
+        if dir_entry.is_dir():
+            stamp["folders"][path] = file_stat.st_mtime_ns
+            continue
+        template_files.append(path)
+
+        # Files are classified once, their stamp is checked when they are copied
+        with open(dir_entry.path, "rb") as f:
+            static = static_file(f.read(), [file_stat.st_mtime_ns, file_stat.st_size])
+        if static is not None:
+            static_files[path] = static
+
+    return {
+        "stamp": stamp,
+        "description": str((template_metadata or {}).get("description", "")),
+        "metadata": template_metadata,
+        "files": sorted(template_files),
+        "paths": {path: destination(path) for path in template_files},
+        "static": static_files,
+        "bundle": None,
+    }
+
+
+def _build_bundle_entry(name, bundle_path):
+    """
+    Build the catalog entry of a bundled template.
+    :param name: Name of the template
+    :param bundle_path: Path to the bundle
+    :returns: The catalog entry
+    """
+    logger.debug(f"indexing bundle '{name}'")
+    bundle_stamp = bundles.stamp(bundle_path)
+    bundle = bundles.open_bundle(bundle_path)
+
+    static_files = {}
+    for path in bundle.files():
+        static = static_file(bundle.read(path))
+        if static is not None:
+            static_files[path] = static
+
+    return {
+        "stamp": {"bundle": bundle_stamp},
+        "description": (bundle.metadata or {}).get("description", ""),
+        "metadata": bundle.metadata,
+        "files": bundle.files(),
+        "paths": {path: destination(path) for path in bundle.files()},
+        "static": static_files,
+        "bundle": bundle_path,
+    }
+
+
+def _entry(name):
+    """
+    Get the up to date catalog entry of a template, rebuilding it if needed.
+    :param name: Name of the template
+    :returns: Tuple(catalog entry or None, True if the index changed)
+    """
+    templates = _load()["templates"]
+    if name in _validated:
+        return templates.get(name), False
+
+    _validated.add(name)
+    template_folder = os.path.join(config.templates_folder, name)
+    bundle_path = template_folder + bundles.EXTENSION
+    current = templates.get(name)
+
+    # Template folders take precedence over bundles
+    if os.path.isdir(template_folder):
+        if current is not None and _is_fresh(template_folder, current["stamp"]):
+            if "metadata" not in current:
+                current["metadata"] = io.yaml_load_compiled(os.path.join(template_folder, "metadata.yml"))
+            return current, False
+        templates[name] = _build_entry(name, template_folder)
+        return templates[name], True
+
+    bundle_stamp = bundles.stamp(bundle_path)
+    if bundle_stamp is not None:
+        if current is not None and current["stamp"].get("bundle") == bundle_stamp:
+            return current, False
+        try:
+            templates[name] = _build_bundle_entry(name, bundle_path)
+        except ValueError as e:
+            logger.warning(f"invalid bundle '{bundle_path}': {e}")
+            templates.pop(name, None)
+            return None, current is not None
+        return templates[name], True
+
+    if current is None:
+        return None, False
+    templates.pop(name)
+    return None, True
+
+
+def entry(name):
+    """
+    Get the catalog entry of a template.
+    :param name: Name of the template
+    :returns: Dictionary with the "description", "metadata", "files", "paths" (destination of each file,
+        see `destination`), "static" (files copied without rendering, see `static_file`) and "bundle" fields.
+        None if the template does not exist.
+    """
+    with _lock:
+        template_entry, changed = _entry(name)
+        if changed:
+            _save()
+        return template_entry
+
+
+def entries():
+    """
+    Get the catalog entries of every template.
+    :returns: Ordered dictionary of template's name to catalog entry
+    """
+    names = set()
+    for name in os.listdir(config.templates_folder):
+        if name.endswith(bundles.EXTENSION):
+            names.add(name[: -len(bundles.EXTENSION)])
+        elif os.path.isdir(os.path.join(config.templates_folder, name)):
+            names.add(name)
+    names = sorted(names)
+
+    with _lock:
+        changed = False
+        templates = _load()["templates"]
+        for name in set(templates.keys()) - set(names):
+            templates.pop(name)
+            changed = True
+
+        catalog = OrderedDict()
+        for name in names:
+            catalog[name], entry_changed = _entry(name)
+            changed = changed or entry_changed
+
+        if changed:
+            _save()
+        return catalog
+
+
+def refresh():
+    """
+    Validate every template again, rebuilding the entries that changed.
+    :returns: True if any entry changed
+    """
+    with _lock:
+        before = dict(_load()["templates"])
+        _validated.clear()
+        after = entries()
+        return before.keys() != after.keys() or any(before[name] is not after[name] for name in after)
+
+
+def reset():
+    """
+    Forget the in-memory index so that every template is validated again.
+    """
+    global _index
+    with _lock:
+        _index = None
+        _validated.clear()
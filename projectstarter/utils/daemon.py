@@ -0,0 +1,88 @@
+import base64
+import json
+import os
+import socket
+import sys
+
+from projectstarter import config
+from projectstarter._version import __version__
+
+# Commands that can be served by the daemon
+COMMANDS = ["start", "templates", "info"]
+
+
+def send(stream, message):
+    """
+    Send a message: one JSON document per line.
+    :param stream: Binary stream to write to
+    :param message: The message to send
+    """
+    stream.write(json.dumps(message).encode("utf8") + b"\n")
+    stream.flush()
+
+
+def _umask():
+    """
+    Get the file mode creation mask of the process.
+    :returns: The mask
+    """
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+def request(command, args, verbose=False, log_format="text"):
+    """
+    Run a command in the daemon, if it is running. The command runs with the
+    environment variables and the umask of the current process, and its output
+    is written to the standard output and error as it arrives.
+    :param command: Name of the command
+    :param args: Arguments given to the command
+    :param verbose: If True, set logging to DEBUG.
+    :param log_format: Format of the log messages, "text" or "json"
+    :returns: The command's exit code. None if the daemon is not available.
+    """
+    if not os.path.exists(config.socket_path):
+        return None
+
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(config.socket_path)
+    except OSError:
+        return None
+
+    with client, client.makefile("rwb") as stream:
+        send(
+            stream,
+            {
+                "version": __version__,
+                "command": command,
+                "args": args,
+                "cwd": os.getcwd(),
+                "environ": dict(os.environ),
+                "umask": _umask(),
+                "templates_folder": config.templates_folder,
+                "cache_folder": config.cache_folder,
+                "verbose": verbose,
+                "log_format": log_format,
+            },
+        )
+        for line in stream:
+            message = json.loads(line.decode("utf8"))
+            if "stream" in message:
+                output = sys.stdout if message["stream"] == "stdout" else sys.stderr
+                if "bytes" in message:
+                    output.flush()
+                    output.buffer.write(base64.b64decode(message["bytes"]))
+                    output.buffer.flush()
+                else:
+                    output.write(message["data"])
+                    output.flush()
+            elif "exit" in message:
+                return message["exit"]
+            elif "refused" in message:
+                # Run the command locally instead
+                return None
+
+    sys.stderr.write("error: the daemon stopped before the end of the command\n")
+    return 1
@@ -1,8 +1,25 @@
+import errno
+import fnmatch
 import os
+import re
 import shutil
+import stat
+import subprocess
+import sys
+import tempfile
 
 from projectstarter.utils import logger
 
+# ioctl request sharing the extents of a file with another one (Linux, on Btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+# renameat2 flag atomically exchanging two paths (Linux)
+_RENAME_EXCHANGE = 2
+
+# Errors meaning that a copy method is not supported for the given files
+# (sendfile only writes to sockets on macOS and fails with ENOTSOCK)
+_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.ENOTSOCK)
+
 
 def mkdir(path, ignore_errors=False):
     """
@@ -25,15 +42,58 @@ def mkdir(path, ignore_errors=False):
     return True
 
 
-def all_in(folder):
+def _matches(path, patterns):
+    """
+    Check if a path matches any of the given glob patterns. Patterns without
+    a '/' are matched against the file name, the others against the whole path.
+    :param path: Path relative to the walked folder, with '/' separators
+    :param patterns: List of glob patterns
+    :returns: True if the path matches
+    """
+    name = path.rsplit("/", 1)[-1]
+    for pattern in patterns:
+        if fnmatch.fnmatchcase(path if "/" in pattern else name, pattern.strip("/")):
+            return True
+    return False
+
+
+def walk(folder, include=None, exclude=None):
     """
-    Generator that yields every file in a folder and its sub-folders.
+    Generator that yields every file and folder in a folder and its sub-folders.
+    Every folder is listed exactly once and excluded folders are not visited.
+    :param folder: Path of the folder to walk
+    :param include: If set, list of glob patterns: only the matching files are yielded
+    :param exclude: List of glob patterns of the files and folders to skip
+    :returns: Generator of (path relative to the folder with '/' separators, os.DirEntry).
+        Folders are yielded before their content.
     """
-    for (folder_path, folders, filenames) in os.walk(folder):
-        for file in filenames:
-            yield os.path.join(folder_path, file)
-        for folder in folders:
-            yield from all_in(folder)
+    exclude = exclude or []
+    folders = [""]
+    while folders:
+        relative_folder = folders.pop()
+        with os.scandir(os.path.join(folder, relative_folder)) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        for entry in entries:
+            path = f"{relative_folder}/{entry.name}" if relative_folder else entry.name
+            if _matches(path, exclude):
+                continue
+            if entry.is_dir():
+                # Like os.walk, symbolic links to folders are not followed
+                if not entry.is_symlink():
+                    yield path, entry
+                    folders.append(path)
+            elif include is None or _matches(path, include):
+                yield path, entry
+
+
+def path_pattern(path):
+    """
+    Build the pattern matching a path in a file content: the path must be followed by a separator,
+    a quote, a blank or the end of the content, so that '/x/proj' does not match '/x/proj2'.
+    :param path: The path
+    :returns: Compiled bytes regular expression
+    """
+    return re.compile(re.escape(os.fsencode(path)) + rb"(?=[/\\\"':;\s]|$)")
 
 
 def rm(path):
@@ -49,3 +109,170 @@ def rm(path):
         return
 
     logger.warning(f"not removing '{path}' as it is not a folder or file")
+
+
+def exchange(path, other):
+    """
+    Atomically exchange two paths: each one gets the other's content.
+    :param path: Path of a file or folder
+    :param other: Path of another file or folder, on the same filesystem
+    :returns: True on success, False if not supported (the paths are left untouched)
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import ctypes
+
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError):
+        return False
+    at_fdcwd = -100
+    if renameat2(at_fdcwd, os.fsencode(path), at_fdcwd, os.fsencode(other), _RENAME_EXCHANGE) != 0:
+        e = ctypes.get_errno()
+        if e in _UNSUPPORTED:
+            return False
+        raise OSError(e, os.strerror(e), path)
+    return True
+
+
+def rm_background(path):
+    """
+    Remove the given path in a detached process, which outlives the current one.
+    The path should already be out of the way (renamed to a temporary name).
+    """
+    logger.debug(f"removing '{path}' in the background")
+    try:
+        # The shell exits right away, leaving `rm` running in its own session
+        subprocess.run(
+            ["sh", "-c", 'rm -rf -- "$1" &', "sh", path],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.debug(f"unable to remove '{path}' in the background: {e}")
+        rm(path)
+
+
+def write_atomic(path, content, mode=0o644):
+    """
+    Write a file atomically: the content is written to a temporary file
+    which then replaces the destination, so that concurrent readers never
+    see a partially written file.
+    :param path: Path of the file to write
+    :param content: Bytes to write
+    :param mode: Permissions of the file
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _reflink(src_fd, dst_fd):
+    """
+    Clone a file: the copy shares the extents of the source until one of them is modified.
+    :returns: True on success, False if not supported
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _copy_loop(copy, src_fd, dst_fd, offset, size):
+    """
+    Copy a range of bytes with a kernel copy function.
+    :param copy: Function (src_fd, dst_fd, offset, count) returning the number of bytes copied
+    :returns: True on success, False if not supported
+    """
+    copied = 0
+    while copied < size:
+        try:
+            n = copy(src_fd, dst_fd, offset + copied, size - copied)
+        except OSError as e:
+            if copied == 0 and e.errno in _UNSUPPORTED:
+                return False
+            raise
+        if n == 0:
+            raise EOFError(f"unexpected end of file after {copied} bytes")
+        copied += n
+    return True
+
+
+def copy_range(src, dst, size, offset=0):
+    """
+    Copy a range of a file to a new file without going through Python buffers.
+    The file is cloned when the filesystem supports it, else copied in the kernel
+    (`copy_file_range`, then `sendfile`), else copied with regular reads and writes.
+    :param src: Path of the file to copy from
+    :param dst: Path of the file to write
+    :param size: Number of bytes to copy
+    :param offset: Position of the first byte to copy in the source file
+    """
+    with open(src, "rb") as src_f, open(dst, "wb") as dst_f:
+        src_fd = src_f.fileno()
+        dst_fd = dst_f.fileno()
+
+        if offset == 0 and size > 0 and _reflink(src_fd, dst_fd):
+            if os.fstat(src_fd).st_size != size:
+                os.ftruncate(dst_fd, size)
+            return
+
+        if hasattr(os, "copy_file_range") and _copy_loop(
+            lambda s, d, o, n: os.copy_file_range(s, d, n, offset_src=o), src_fd, dst_fd, offset, size
+        ):
+            return
+
+        if hasattr(os, "sendfile") and _copy_loop(
+            lambda s, d, o, n: os.sendfile(d, s, o, n), src_fd, dst_fd, offset, size
+        ):
+            return
+
+        src_f.seek(offset)
+        remaining = size
+        while remaining > 0:
+            chunk = src_f.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                raise EOFError(f"unexpected end of file '{src}'")
+            dst_f.write(chunk)
+            remaining -= len(chunk)
+
+
+def clone(src, dst, hardlink=False):
+    """
+    Copy a file, sharing its content with the source when possible: the file is cloned
+    when the filesystem supports it, else hard linked if allowed, else copied (see `copy_range`).
+    The permissions of the source are kept.
+    :param src: Path of the file to copy
+    :param dst: Path of the file to write
+    :param hardlink: Can the copy be a hard link to the source, when it can not be cloned
+    """
+    src_stat = os.stat(src)
+    with open(src, "rb") as src_f, open(dst, "wb") as dst_f:
+        cloned = src_stat.st_size == 0 or _reflink(src_f.fileno(), dst_f.fileno())
+    if not cloned and hardlink:
+        os.remove(dst)
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    if not cloned:
+        copy_range(src, dst, src_stat.st_size)
+    os.chmod(dst, stat.S_IMODE(src_stat.st_mode))
@@ -1,8 +1,30 @@
+import hashlib
+import marshal
 import os
 import sys
 
 import yaml
 
+from projectstarter import config
+from projectstarter.utils import files, logger
+
+# Available Yaml backends: name -> (loader, dumper)
+backends = {"python": (yaml.FullLoader, yaml.Dumper)}
+if getattr(yaml, "__with_libyaml__", False):
+    backends["libyaml"] = (yaml.CFullLoader, yaml.CDumper)
+
+# Yaml backend in use, the fastest available by default
+_loader, _dumper = backends.get("libyaml", backends["python"])
+
+
+def use_backend(name):
+    """
+    Select the Yaml backend to use.
+    :param name: Name of the backend (see `backends`)
+    """
+    global _loader, _dumper
+    _loader, _dumper = backends[name]
+
 
 def yaml_load(file_path):
     """
@@ -14,7 +36,7 @@ def yaml_load(file_path):
         return None
 
     with open(file_path, "r", encoding="utf8") as f:
-        return yaml.load(f, Loader=yaml.FullLoader)
+        return yaml.load(f, Loader=_loader)
 
 
 def yaml_load_str(string):
@@ -23,13 +45,56 @@ def yaml_load_str(string):
     :param string: String to load
     :returns: Dictionary matching the Yaml string's content
     """
-    return yaml.load(string, Loader=yaml.FullLoader)
+    return yaml.load(string, Loader=_loader)
+
+
+def _sidecar_path(file_path):
+    """
+    Get the path of the compiled version of a Yaml file.
+    :param file_path: Path to the Yaml file
+    :returns: Path to the compiled file, in the cache folder
+    """
+    key = hashlib.sha1(os.path.abspath(file_path).encode("utf8")).hexdigest()
+    return os.path.join(config.cache_folder, "yaml", f"{key}.marshal")
+
+
+def yaml_load_compiled(file_path):
+    """
+    Load a Yaml file through its compiled (marshal) version. The compiled
+    version is stored in the cache folder and rebuilt when the source hash changes.
+    :param file_path: Path to the file to read
+    :returns: Dictionary matching the Yaml file's content
+    """
+    try:
+        with open(file_path, "rb") as f:
+            source = f.read()
+    except FileNotFoundError:
+        return None
+    source_hash = hashlib.sha1(source).digest()
+    sidecar_path = _sidecar_path(file_path)
+
+    try:
+        with open(sidecar_path, "rb") as f:
+            sidecar_hash, content = marshal.load(f)
+        if sidecar_hash == source_hash:
+            return content
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    content = yaml_load_str(source.decode("utf8"))
+    try:
+        os.makedirs(os.path.dirname(sidecar_path), exist_ok=True)
+        files.write_atomic(sidecar_path, marshal.dumps((source_hash, content)))
+    except (OSError, ValueError) as e:
+        logger.debug(f"unable to compile '{file_path}': {e}")
+
+    return content
 
 
-def yaml_dump(content, stream=sys.stdout):
+def yaml_dump(content, stream=None):
     """
     Dump (write) a Yaml content to stream.
     :param content: Yaml string
-    :param stream: Stream to dump the Yaml string to
+    :param stream: Stream to dump the Yaml string to (default: sys.stdout)
     """
-    yaml.dump(content, stream=stream, default_flow_style=False)
+    yaml.dump(content, stream=stream or sys.stdout, Dumper=_dumper, default_flow_style=False)
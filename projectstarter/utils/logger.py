@@ -1,79 +1,216 @@
+import atexit
+import contextlib
+import json
 import logging
+import logging.handlers
+import os
+import queue
 
 # Create main logger
 _logger = logging.getLogger("ProjectStarter")
 
+# Handler queueing the records of the main logger, and the thread writing them
+_queue_handler = None
+_listener = None
 
-def setup(verbose=False):
+
+class _Message:
+    """
+    Log message, only formatted when a handler emits it.
+    """
+
+    __slots__ = ("msg", "args", "prefix", "tag", "_text")
+
+    def __init__(self, msg, args, prefix=None, tag=""):
+        """
+        :param msg: Message to log
+        :param args: Values appended to the message, separated by spaces
+        :param prefix: If set, prefix of message
+        :param tag: Level tag written before the message ("error: ", ...)
+        """
+        self.msg = msg
+        self.args = args
+        self.prefix = prefix
+        self.tag = tag
+        self._text = None
+
+    @property
+    def text(self):
+        """
+        The message and its values, without prefix nor tag. It is formatted once, for every handler.
+        """
+        if self._text is None:
+            if len(self.args) == 0:
+                self._text = str(self.msg)
+            else:
+                values = (
+                    arg.decode("utf-8", errors="replace") if isinstance(arg, bytes) else str(arg) for arg in self.args
+                )
+                self._text = f"{self.msg} {' '.join(values)}"
+        return self._text
+
+    def __str__(self):
+        return f"{self.prefix or ''}{self.tag}{self.text}"
+
+
+class _JsonFormatter(logging.Formatter):
+    """
+    Formatter writing each record as a JSON document on a single line.
+    """
+
+    def format(self, record):
+        msg = record.msg
+        entry = {
+            "time": record.created,
+            "level": record.levelname.lower(),
+            "message": msg.text if isinstance(msg, _Message) else record.getMessage(),
+        }
+        if isinstance(msg, _Message) and msg.prefix:
+            entry["prefix"] = msg.prefix
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _stop_listener():
+    """
+    Write the queued records and stop the writing thread.
+    """
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+
+
+def _after_fork():
+    """
+    Write the records directly in forked processes (e.g. the process pool workers):
+    the thread writing the queued records only runs in the parent process.
+    """
+    global _listener
+    _listener = None
+    if _queue_handler is not None and _queue_handler in _logger.handlers:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(_queue_handler.formatter)
+        _logger.removeHandler(_queue_handler)
+        _logger.addHandler(stream_handler)
+
+
+def _make_formatter(log_format):
+    """
+    Create the formatter of the messages.
+    :param log_format: "text" or "json"
+    :returns: The formatter
+    """
+    return _JsonFormatter() if log_format == "json" else logging.Formatter()
+
+
+def setup(verbose=False, log_format="text"):
     """
     Setup logging level and output style. The default level of logging is set
-    to INFO.
+    to INFO. Records are queued and written to stderr by a background thread.
+    It can be called again to change the settings.
     :param verbose: If True, set logging to DEBUG.
+    :param log_format: "text", or "json" for one JSON document per record
     """
+    global _queue_handler, _listener
+
     # Set logging level
     log_level = logging.DEBUG if verbose else logging.INFO
     _logger.setLevel(log_level)
 
-    # Enable logging in stdout
-    stream_handler = logging.StreamHandler()
+    if _queue_handler is None:
+        # The messages are formatted by the queue handler, the listener only writes them
+        _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+        _logger.addHandler(_queue_handler)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_after_fork)
+        atexit.register(_stop_listener)
+    if _listener is None:
+        # Enable logging in stderr
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, logging.StreamHandler())
+        _listener.start()
+    _queue_handler.setFormatter(_make_formatter(log_format))
+    _queue_handler.setLevel(log_level)
+
+
+@contextlib.contextmanager
+def redirect(stream, verbose=False, log_format="text"):
+    """
+    Context manager sending the log messages to the given stream instead
+    of the configured handlers.
+    :param stream: Stream to write the messages to
+    :param verbose: If True, set logging to DEBUG.
+    :param log_format: "text", or "json" for one JSON document per record
+    """
+    handlers, level = _logger.handlers, _logger.level
+    log_level = logging.DEBUG if verbose else logging.INFO
+    stream_handler = logging.StreamHandler(stream)
     stream_handler.setLevel(log_level)
-    _logger.addHandler(stream_handler)
+    stream_handler.setFormatter(_make_formatter(log_format))
+    _logger.handlers = [stream_handler]
+    _logger.setLevel(log_level)
+    try:
+        yield
+    finally:
+        _logger.handlers = handlers
+        _logger.setLevel(level)
 
 
-def _log(func, msg, prefix, **kwargs):
+def _log(level, tag, msg, args, prefix, kwargs):
     """
-    Log a message with a '{prefix}{msg}' format.
-    :param func: Function to use for logging
+    Log a message with a '{prefix}{tag}{msg} {args}' format.
+    Nothing is formatted if the level is disabled.
+    :param level: Level of the message
+    :param tag: Level tag written before the message
     :param msg: Message to log
+    :param args: Values appended to the message, separated by spaces
     :param prefix: Prefix of message
-    :param kwargs: Any arguments that can be given to func
+    :param kwargs: Any arguments that can be given to the logging functions
     """
-    func(f"{prefix or ''}{msg}", **kwargs)
+    if _logger.isEnabledFor(level):
+        _logger.log(level, _Message(msg, args, prefix, tag), **kwargs)
 
 
 def info(msg, *args, prefix=None, **kwargs):
     """
     Log an info message.
     :param msg: Message to log
+    :param args: Values appended to the message, only converted to strings if the message is written
     :param prefix: If set, prefix of message
     :param kwargs: Any arguments that can be given to the info function
     """
-    if len(args) > 0:
-        msg = f"{msg} {' '.join(args)}"
-    _log(_logger.info, msg, prefix, **kwargs)
+    _log(logging.INFO, "", msg, args, prefix, kwargs)
 
 
 def error(msg, *args, prefix=None, **kwargs):
     """
     Log an error message.
     :param msg: Message to log
+    :param args: Values appended to the message, only converted to strings if the message is written
     :param prefix: If set, prefix of message
     :param kwargs: Any arguments that can be given to the info function
     """
-    if len(args) > 0:
-        msg = f"{msg} {' '.join(args)}"
-    _log(_logger.error, f"error: {msg}", prefix, **kwargs)
+    _log(logging.ERROR, "error: ", msg, args, prefix, kwargs)
 
 
 def warning(msg, *args, prefix=None, **kwargs):
     """
     Log a warning message.
     :param msg: Message to log
+    :param args: Values appended to the message, only converted to strings if the message is written
     :param prefix: If set, prefix of message
     :param kwargs: Any arguments that can be given to the info function
     """
-    if len(args) > 0:
-        msg = f"{msg} {' '.join(args)}"
-    _log(_logger.warning, f"warning: {msg}", prefix, **kwargs)
+    _log(logging.WARNING, "warning: ", msg, args, prefix, kwargs)
 
 
 def debug(msg, *args, prefix=None, **kwargs):
     """
     Log a debug message.
     :param msg: Message to log
+    :param args: Values appended to the message, only converted to strings if the message is written
     :param prefix: If set, prefix of message
     :param kwargs: Any arguments that can be given to the info function
     """
-    if len(args) > 0:
-        msg = f"{msg} {' '.join(args)}"
-    _log(_logger.debug, f"debug: {msg}", prefix, **kwargs)
+    _log(logging.DEBUG, "debug: ", msg, args, prefix, kwargs)
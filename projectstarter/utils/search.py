@@ -0,0 +1,270 @@
+import difflib
+import hashlib
+import heapq
+import json
+import os
+import re
+import threading
+
+from projectstarter import config
+from projectstarter.utils import catalog, files, logger, templates
+
+# Version of the index format, to increase whenever the documents change
+_VERSION = 1
+
+# Weight of a match in each field of a template
+_WEIGHTS = {"name": 8, "description": 4, "option": 2, "option description": 1}
+
+# Minimum similarity between a query term and a word for a fuzzy match
+_FUZZY_THRESHOLD = 0.75
+
+# In-memory search index
+_index = None
+
+# Lock protecting the in-memory index from concurrent updates
+_lock = threading.Lock()
+
+
+def _index_path():
+    """
+    Get the path of the search index file.
+    :returns: Path to the index file
+    """
+    return os.path.join(config.cache_folder, "search.json")
+
+
+def _trigrams(text):
+    """
+    Get the trigrams of a text, each word being padded with spaces.
+    :param text: Lowercase text
+    :returns: Set of trigrams
+    """
+    trigrams = set()
+    for word in re.findall(r"\w+", text):
+        word = f" {word} "
+        trigrams.update(word[i : i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+def _options_fields(options, prefix=""):
+    """
+    Get the searchable fields of an options tree.
+    :param options: The options dictionary
+    :param prefix: Path of the parent option
+    :returns: List of (field, text, option path)
+    """
+    fields = []
+    for name, value in (options or {}).items():
+        path = f"{prefix}{name}"
+        fields.append(("option", name.lower(), path))
+        if isinstance(value, dict):
+            if value.get("description"):
+                fields.append(("option description", str(value["description"]).lower(), path))
+            fields += _options_fields(value.get("options"), path + config.options_sep)
+    return fields
+
+
+def _document(name, template_metadata):
+    """
+    Build the search document of a template.
+    :param name: Name of the template
+    :param template_metadata: The template's metadata, with its included templates resolved
+    :returns: Dictionary with the "name", "description" and "fields" fields
+    """
+    description = str(template_metadata.get("description", "")).lower().strip()
+    fields = [("name", name.lower(), None), ("description", description, None)]
+    fields += _options_fields(template_metadata.get("options"))
+    return {"name": name, "description": description, "fields": fields}
+
+
+def _signature(entries):
+    """
+    Get the signature of the catalog: the index is rebuilt when it changes.
+    :param entries: The catalog entries
+    :returns: Hexadecimal signature
+    """
+    stamps = {name: entry["stamp"] if entry is not None else None for name, entry in entries.items()}
+    return hashlib.sha1(json.dumps(stamps, sort_keys=True).encode("utf8")).hexdigest()
+
+
+def _build(signature, names):
+    """
+    Build the search index.
+    :param signature: Signature of the catalog
+    :param names: Names of the templates
+    :returns: The search index
+    """
+    logger.debug("building the search index")
+    documents = []
+    postings = {}
+    for name in names:
+        template_metadata = templates.metadata(name)
+        if template_metadata is None:
+            continue
+        document = _document(name, template_metadata)
+        for _, text, _ in document["fields"]:
+            for trigram in _trigrams(text):
+                doc_ids = postings.setdefault(trigram, [])
+                if len(doc_ids) == 0 or doc_ids[-1] != len(documents):
+                    doc_ids.append(len(documents))
+        documents.append(document)
+    return {"version": _VERSION, "signature": signature, "documents": documents, "trigrams": postings}
+
+
+def _load(signature):
+    """
+    Load the search index from disk.
+    :param signature: Signature of the catalog
+    :returns: The search index. None if it is missing or out of date.
+    """
+    try:
+        with open(_index_path(), "r", encoding="utf8") as f:
+            index = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.debug(f"search index not loaded: {e}")
+        return None
+    if index.get("version") != _VERSION or index.get("signature") != signature:
+        return None
+    return index
+
+
+def _save(index):
+    """
+    Write the search index to disk, atomically.
+    :param index: The search index
+    """
+    path = _index_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        files.write_atomic(path, json.dumps(index).encode("utf8"))
+    except (OSError, TypeError, ValueError) as e:
+        logger.debug(f"search index not saved: {e}")
+
+
+def _get_index():
+    """
+    Get the up to date search index, loading or rebuilding it if needed.
+    :returns: The search index
+    """
+    global _index
+    entries = catalog.entries()
+    signature = _signature(entries)
+    with _lock:
+        if _index is None or _index["signature"] != signature:
+            _index = _load(signature)
+            if _index is None:
+                _index = _build(signature, entries.keys())
+                _save(_index)
+        return _index
+
+
+def _similarity(term, text):
+    """
+    Get the best similarity between a term and the words of a text.
+    :param term: Lowercase query term
+    :param text: Lowercase text
+    :returns: Similarity between 0 and 1
+    """
+    best = 0
+    matcher = difflib.SequenceMatcher(b=term)
+    for word in re.findall(r"\w+", text):
+        matcher.set_seq1(word)
+        if matcher.real_quick_ratio() > best and matcher.quick_ratio() > best:
+            best = max(best, matcher.ratio())
+    return best
+
+
+def _score_term(term, document):
+    """
+    Score a query term against a document.
+    Substring matches rank above fuzzy ones, and matches at the start of a word above the others.
+    :param term: Lowercase query term
+    :param document: The search document
+    :returns: Tuple(score, set of the best matching options paths). Score is 0 if the term does not match.
+    """
+    best = 0
+    options = set()
+    for field, text, option in document["fields"]:
+        position = text.find(term)
+        if position >= 0:
+            score = _WEIGHTS[field] * (2 if position == 0 or not text[position - 1].isalnum() else 1)
+            if text == term:
+                score *= 2
+        else:
+            similarity = _similarity(term, text)
+            if similarity < _FUZZY_THRESHOLD:
+                continue
+            score = _WEIGHTS[field] * similarity * 0.5
+        # Only the best matches are reported
+        if score > best:
+            best = score
+            options = set()
+        if score == best and option is not None:
+            options.add(option)
+    return best, options
+
+
+def documents():
+    """
+    Get the search documents of every template.
+    :returns: List of dictionaries with the "name" and "description" fields, ordered by name
+    """
+    return sorted(
+        ({"name": doc["name"], "description": doc["description"]} for doc in _get_index()["documents"]),
+        key=lambda doc: doc["name"],
+    )
+
+
+def search(query, offset=0, limit=None):
+    """
+    Search the templates by name, description, option names and option descriptions.
+    Every word of the query must match, as a substring or approximately.
+    :param query: The query
+    :param offset: Number of results to skip
+    :param limit: Maximum number of results (default: every result)
+    :returns: Generator of dictionaries with the "name", "description", "score" and "options" (matched options) fields,
+        best results first
+    """
+    index = _get_index()
+    doc_ids = list(range(len(index["documents"])))
+    terms = query.lower().split()
+    for term in terms:
+        term_trigrams = _trigrams(term)
+        # Candidates share at least one trigram with the term, short terms can match anywhere
+        if len(term) >= 3 and len(term_trigrams) > 0:
+            candidates = set()
+            for trigram in term_trigrams:
+                candidates.update(index["trigrams"].get(trigram, []))
+            doc_ids = [doc_id for doc_id in doc_ids if doc_id in candidates]
+
+    results = []
+    for doc_id in doc_ids:
+        document = index["documents"][doc_id]
+        score = 0
+        options = set()
+        for term in terms:
+            term_score, term_options = _score_term(term, document)
+            if term_score == 0:
+                break
+            score += term_score
+            options |= term_options
+        else:
+            results.append((score, document["name"], sorted(options), document["description"]))
+
+    count = None if limit is None else offset + limit
+    ranked = (
+        sorted(results, key=lambda r: (-r[0], r[1]))
+        if count is None
+        else heapq.nsmallest(count, results, key=lambda r: (-r[0], r[1]))
+    )
+    for score, name, options, description in ranked[offset:]:
+        yield {"name": name, "description": description, "score": score, "options": options}
+
+
+def reset():
+    """
+    Forget the in-memory search index.
+    """
+    global _index
+    with _lock:
+        _index = None
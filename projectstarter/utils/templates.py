@@ -1,12 +1,71 @@
+import functools
+import json
 import os
 import shutil
 from collections import OrderedDict
 
 import jinja2
-import yaml
 
 from projectstarter import config
-from projectstarter.utils import io, logger
+from projectstarter.utils import bundles, catalog, files, io, logger, tracing
+
+
+# Jinja environment used to render the templates files
+_jenv = None
+
+# Jinja environment used to render strings, and its compiled strings cache
+_string_jenv = None
+_compile_string = None
+
+# Metadata of the templates with their included templates resolved
+_resolved = {}
+
+
+class _BytecodeCache(jinja2.FileSystemBytecodeCache):
+    """
+    Jinja bytecode cache stored on disk. Entries are keyed by template name
+    and path and are invalidated when the source checksum changes.
+    Writes are atomic so that the cache can be shared between processes.
+    """
+
+    def dump_bytecode(self, bucket):
+        path = self._get_cache_filename(bucket)
+        try:
+            files.write_atomic(path, bucket.bytecode_to_string())
+        except OSError as e:
+            logger.debug(f"unable to write bytecode cache '{path}': {e}")
+
+
+class _BundleLoader(jinja2.BaseLoader):
+    """
+    Jinja loader reading the templates files straight from their bundle.
+    Template names are '{template name}/{file path in the template}'.
+    """
+
+    def get_source(self, environment, template):
+        name, _, file_path = template.partition("/")
+        bundle_path = os.path.join(config.templates_folder, name + bundles.EXTENSION)
+        try:
+            bundle = bundles.open_bundle(bundle_path)
+            source = bundle.read(file_path).decode("utf8")
+        except (OSError, KeyError, ValueError):
+            raise jinja2.TemplateNotFound(template)
+        bundle_stamp = bundles.stamp(bundle_path)
+        return source, f"{bundle_path}/{file_path}", lambda: bundles.stamp(bundle_path) == bundle_stamp
+
+
+def _bytecode_cache():
+    """
+    Create the bytecode cache in the configured cache folder.
+    :returns: The bytecode cache. None if the cache folder is not writable.
+    """
+    cache_folder = os.path.join(config.cache_folder, "jinja")
+    try:
+        os.makedirs(cache_folder, exist_ok=True)
+    except OSError as e:
+        logger.debug(f"bytecode cache disabled: {e}")
+        return None
+    return _BytecodeCache(cache_folder, pattern="%s.cache")
 
 
 def _prepare_jenv(jenv):
@@ -17,6 +76,74 @@ def _prepare_jenv(jenv):
     jenv.globals["which"] = shutil.which
 
 
+def _file_jenv():
+    """
+    Get the Jinja environment used to render the templates files.
+    It is created on first use and shared afterwards.
+    :returns: Jinja's environment
+    """
+    global _jenv
+    if _jenv is None:
+        _jenv = jinja2.Environment(
+            loader=jinja2.ChoiceLoader([jinja2.FileSystemLoader(searchpath=config.templates_folder), _BundleLoader()]),
+            bytecode_cache=_bytecode_cache(),
+            cache_size=config.jinja_cache_size,
+        )
+        _prepare_jenv(_jenv)
+    return _jenv
+
+
+def _template_name(path):
+    """
+    Get the Jinja template name of a file from its path.
+    :param path: Path to a file of the templates folder (for bundled templates,
+                 the path the file would have if the template was not bundled)
+    :returns: Template name, relative to the templates folder
+    """
+    return os.path.relpath(path, config.templates_folder).replace(os.sep, "/")
+
+
+def _string_cache():
+    """
+    Get the compiled strings cache. Compiled strings are kept in a bounded
+    LRU cache so that identical strings are only compiled once.
+    :returns: Function compiling a string into a Jinja template
+    """
+    global _string_jenv, _compile_string
+    if _compile_string is None:
+        _string_jenv = jinja2.Environment(loader=jinja2.BaseLoader())
+        _prepare_jenv(_string_jenv)
+        _compile_string = functools.lru_cache(maxsize=config.string_cache_size)(_string_jenv.from_string)
+    return _compile_string
+
+
+def cache_info():
+    """
+    Get the statistics of the compiled strings cache.
+    :returns: Named tuple (hits, misses, maxsize, currsize)
+    """
+    return _string_cache().cache_info()
+
+
+def reload():
+    """
+    Forget the resolved metadata so that it is loaded again from the catalog.
+    Compiled templates are kept: their files are checked each time they are used.
+    """
+    _resolved.clear()
+
+
+def reset():
+    """
+    Drop the shared Jinja environments, the resolved metadata and their caches.
+    """
+    global _jenv, _string_jenv, _compile_string
+    _jenv = None
+    _string_jenv = None
+    _compile_string = None
+    _resolved.clear()
+
+
 def parse_string(string, data):
     """
     Render Jinja environment from string.
@@ -24,9 +151,7 @@ def parse_string(string, data):
     :param data: The data to give to the renderer
     :returns: The rendered string
     """
-    jenv = jinja2.Environment(loader=jinja2.BaseLoader()).from_string(string)
-    _prepare_jenv(jenv)
-    return jenv.render(**data)
+    return _string_cache()(string).render(**data)
 
 
 def parse_yaml(yaml_string, data):
@@ -37,7 +162,7 @@ def parse_yaml(yaml_string, data):
     :returns: The yaml dictionary after render
     """
     parsed_yaml = parse_string(yaml_string, data)
-    return yaml.load(parsed_yaml, Loader=yaml.FullLoader)
+    return io.yaml_load_str(parsed_yaml)
 
 
 def parse(path, data):
@@ -47,21 +172,81 @@ def parse(path, data):
     :param data: Data to use when parsing
     :returns: Rendered Jinja template
     """
-    logger.debug(f"Parsing '{path}'")
-    loader = jinja2.FileSystemLoader(searchpath=os.path.dirname(path))
+    logger.debug("Parsing", path)
+    template = _file_jenv().get_template(_template_name(path))
+    return template.render(**data)
+
+
+def compile(path):
+    """
+    Compile the given file and store its bytecode in the cache.
+    :param path: Path to the file to compile
+    """
+    _file_jenv().get_template(_template_name(path))
 
-    jenv = jinja2.Environment(loader=loader)
-    _prepare_jenv(jenv)
 
-    template = jenv.get_template(os.path.basename(path))
-    return template.render(**data)
+def clear_cache():
+    """
+    Remove every compiled template from the bytecode cache.
+    """
+    bytecode_cache = _file_jenv().bytecode_cache
+    if bytecode_cache is not None:
+        bytecode_cache.clear()
+
+
+class _IncludeError(Exception):
+    """
+    Error raised when the included templates can not be resolved.
+    """
+
+
+def _copy_dicts(data):
+    """
+    Copy every dictionary of a metadata tree. Lists and values are shared
+    with the original tree: they must be replaced instead of modified in place.
+    :param data: The metadata tree to copy
+    :return: The copied tree
+    """
+    return {k: _copy_dicts(v) if isinstance(v, dict) else v for k, v in data.items()}
 
 
-def _include_templates(data):
+def _item_key(item):
+    """
+    Get a hashable key identifying a list item.
+    :param item: The list item
+    :return: The item itself if hashable, else a key built from its content
+    """
+    try:
+        hash(item)
+        return item
+    except TypeError:
+        return ("unhashable", json.dumps(item, sort_keys=True, default=str))
+
+
+def _merge_lists(current, new):
+    """
+    Merge two lists with ordered set semantics, in linear time.
+    :param current: The list to extend
+    :param new: The items to add at the end of the list if not already present
+    :return: A new merged list
+    """
+    merged = list(current)
+    seen = set(_item_key(item) for item in merged)
+    for item in new:
+        key = _item_key(item)
+        if key not in seen:
+            seen.add(key)
+            merged.append(item)
+    return merged
+
+
+def _include_templates(data, stack):
     """
     Recursively iterate through every fields of a dictionary and replace the
     'include_templates' fields with the corresponding template's metadata.
+    The included metadata is shared with the resolver cache (see `_copy_dicts`).
     :param data: The metadata to update
+    :param stack: Names of the templates being resolved, to detect cycles
     :return: The updated metadata
     """
     templates = []
@@ -69,7 +254,7 @@ def _include_templates(data):
     for k, v in data.items():
         # Recursive iteration
         if isinstance(v, dict):
-            data[k] = _include_templates(v)
+            data[k] = _include_templates(v, stack)
         # Extract templates to include
         elif k == "include_templates":
             templates += v
@@ -81,28 +266,44 @@ def _include_templates(data):
 
         # Update fields with template's data
         for template in templates:
-            logger.debug(f"including template: {template}")
-            included_data = metadata(template)
-            logger.debug(f"{template} template data: {included_data}")
+            logger.debug("including template:", template)
+            included_data = _resolve(template, stack)
             # Append new values to the data
             for k, v in included_data.items():
                 # If it does not exist, add the new field
                 if k not in data.keys():
                     data[k] = v
 
-                # If its a list, append item to existing values if necessary
+                # If its a list, append items to existing values if necessary
                 elif isinstance(data[k], list):
-                    if isinstance(v, list):
-                        for item in v:
-                            if item not in data[k]:
-                                data[k].append(item)
-                    else:
-                        if v not in data[k]:
-                            data[k].append(v)
+                    data[k] = _merge_lists(data[k], v if isinstance(v, list) else [v])
 
     return data
 
 
+def _resolve(name, stack=()):
+    """
+    Get the metadata of a template with its included templates resolved.
+    Each template is only resolved once per session, the result is shared
+    and must not be modified.
+    :param name: Name of the template
+    :param stack: Names of the templates being resolved, to detect cycles
+    :return: The resolved metadata
+    """
+    if name in _resolved:
+        return _resolved[name]
+
+    if name in stack:
+        raise _IncludeError(f"include cycle detected: {' -> '.join(stack + (name,))}")
+
+    template_entry = catalog.entry(name)
+    if template_entry is None or template_entry["metadata"] is None:
+        raise _IncludeError(f"template '{name}' missing or empty 'metadata.yml' file")
+
+    _resolved[name] = _include_templates(_copy_dicts(template_entry["metadata"]), stack + (name,))
+    return _resolved[name]
+
+
 def metadata(name, include=True):
     """
     Retrieve the metadata from the 'templates/{name}/metadata.yml' file.
@@ -110,20 +311,25 @@ def metadata(name, include=True):
     :param include: Load included templates
     :returns: Dictionary of metadata on success. None on error.
     """
-    metadata_path = os.path.join(config.templates_folder, name, "metadata.yml")
-    logger.debug(f"metadata.yml path: {metadata_path}")
+    logger.debug(f"loading template '{name}' from the catalog")
 
     # Load template metadata
-    template_metadata = io.yaml_load(metadata_path)
-    if template_metadata is None:
+    with tracing.span("catalog entry", template=name):
+        template_entry = catalog.entry(name)
+    if template_entry is None or template_entry["metadata"] is None:
         logger.warning(f"template '{name}' missing or empty 'metadata.yml' file")
         return None
 
-    # Load included templates
-    if include:
-        template_metadata = _include_templates(template_metadata)
+    if not include:
+        return _copy_dicts(template_entry["metadata"])
 
-    return template_metadata
+    # Load included templates
+    try:
+        with tracing.span("resolve includes", template=name):
+            return _copy_dicts(_resolve(name))
+    except _IncludeError as e:
+        logger.error(e)
+        return None
 
 
 def all():
@@ -132,7 +338,7 @@ def all():
     :returns: Ordered dictionary of template's name
     """
     templates = {}
-    for template in os.listdir(config.templates_folder):
+    for template in catalog.entries().keys():
         template_metadata = metadata(template)
         if template_metadata is not None:
             templates[template] = template_metadata
@@ -0,0 +1,127 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Recorded trace events, None when tracing is disabled
+_events = None
+
+# Identifiers of the named tracks, which display spans not tied to a thread
+_tracks = {}
+
+# Lock protecting the events from concurrent updates
+_lock = threading.Lock()
+
+
+def now():
+    """
+    Get the current time, in the unit of the trace events.
+    :returns: Time in microseconds
+    """
+    return time.perf_counter_ns() // 1000
+
+
+def enable():
+    """
+    Start recording trace events.
+    """
+    global _events
+    with _lock:
+        if _events is None:
+            _events = []
+
+
+def enabled():
+    """
+    Check if trace events are recorded.
+    :returns: True if tracing is enabled
+    """
+    return _events is not None
+
+
+def add(name, start, end, category="projectstarter", tid=None, **args):
+    """
+    Record a span that already ended.
+    :param name: Name of the span
+    :param start: Start time (see `now`)
+    :param end: End time (see `now`)
+    :param category: Category of the span
+    :param tid: Identifier of the track the span is displayed on (default: current thread)
+    :param args: Values displayed with the span
+    """
+    if _events is None:
+        return
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": start,
+        "dur": end - start,
+        "pid": os.getpid(),
+        "tid": threading.get_ident() if tid is None else tid,
+    }
+    if args:
+        event["args"] = {k: str(v) for k, v in args.items()}
+    with _lock:
+        _events.append(event)
+
+
+def track(name):
+    """
+    Get the identifier of a named track, to display spans which are not tied to a thread
+    (e.g. commands running concurrently in an event loop).
+    :param name: Name of the track
+    :returns: Identifier to give as the `tid` of the spans
+    """
+    with _lock:
+        if name not in _tracks:
+            _tracks[name] = len(_tracks) + 1
+            if _events is not None:
+                _events.append(
+                    {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": _tracks[name], "args": {"name": name}}
+                )
+        return _tracks[name]
+
+
+@contextlib.contextmanager
+def _span(name, category, args):
+    start = now()
+    try:
+        yield
+    finally:
+        add(name, start, now(), category, **args)
+
+
+def span(name, category="projectstarter", **args):
+    """
+    Context manager recording a span around its block. It does nothing when tracing is disabled.
+    :param name: Name of the span
+    :param category: Category of the span
+    :param args: Values displayed with the span
+    :returns: The context manager
+    """
+    if _events is None:
+        return contextlib.nullcontext()
+    return _span(name, category, args)
+
+
+def write(path):
+    """
+    Write the recorded events to a Chrome trace-event file (chrome://tracing, Perfetto, ...).
+    :param path: Path of the file to write
+    """
+    with _lock:
+        events = list(_events or [])
+    with open(path, "w", encoding="utf8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def reset():
+    """
+    Stop recording trace events and forget the recorded ones.
+    """
+    global _events
+    with _lock:
+        _events = None
+        _tracks.clear()
@@ -0,0 +1,42 @@
+import os
+
+from projectstarter.commands import start
+
+
+def _run(tmp_path, manifest, *args):
+    manifest_path = tmp_path / "manifest.yml"
+    manifest_path.write_text(manifest)
+    return start.run(start.parse("project start", ["--batch", str(manifest_path), *args]))
+
+
+def test_batch(tmp_path):
+    manifest = (
+        f"- template: bash\n"
+        f"  output: {tmp_path / 'a'}\n"
+        f"  options: [readme]\n"
+        f"- template: bash\n"
+        f"  output: {tmp_path / 'b'}\n"
+        f"  options: [cli]\n"
+    )
+
+    assert _run(tmp_path, manifest, "-j", "2") == 0
+    assert os.path.isfile(tmp_path / "a" / "README.md")
+    assert os.path.isfile(tmp_path / "b" / "src" / "cli.sh")
+    assert not os.path.exists(tmp_path / "b" / "README.md")
+
+
+def test_batch_failure(tmp_path):
+    manifest = (
+        f"- template: does_not_exist\n"
+        f"  output: {tmp_path / 'a'}\n"
+        f"- template: bash\n"
+        f"  output: {tmp_path / 'b'}\n"
+        f"  options: [readme]\n"
+    )
+
+    assert _run(tmp_path, manifest) == 1
+    assert os.path.isfile(tmp_path / "b" / "README.md")
+
+
+def test_batch_invalid_manifest(tmp_path):
+    assert _run(tmp_path, "- template: bash\n") == 1
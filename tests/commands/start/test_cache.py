@@ -0,0 +1,115 @@
+import hashlib
+import os
+import time
+
+from projectstarter.commands.start import cache, run_commands
+
+# Command with effects on the project, counting its runs outside of it
+COMMAND = {
+    "run": 'echo run >> ../runs && pwd > where.txt && mkdir -p bin && ln -s "$PWD/where.txt" bin/link && rm gone',
+    "cache": True,
+}
+
+
+def _project(tmp_path, name):
+    project = tmp_path / "projects" / name
+    project.mkdir(parents=True)
+    (project / "gone").write_text("removed by the command")
+    return project
+
+
+def test_replay(tmp_path):
+    first = _project(tmp_path, "first")
+    second = _project(tmp_path, "second")
+
+    assert run_commands([COMMAND], str(first)) == 0
+    assert run_commands([COMMAND], str(second)) == 0
+
+    # The command ran once, its effects were replayed and relocated in the second project
+    assert (tmp_path / "projects" / "runs").read_text() == "run\n"
+    assert (second / "where.txt").read_text() == f"{second}\n"
+    assert os.readlink(second / "bin" / "link") == str(second / "where.txt")
+    assert not os.path.exists(second / "gone")
+
+
+def test_replay_only_relocates_whole_paths(tmp_path):
+    first = _project(tmp_path, "first")
+    second = _project(tmp_path, "second")
+    command = {"run": 'echo "$PWD/a ${PWD}2/b" > paths.txt', "cache": True}
+
+    assert run_commands([command], str(first)) == 0
+    assert run_commands([command], str(second)) == 0
+
+    # The sibling path is left as is
+    assert (second / "paths.txt").read_text() == f"{second}/a {first}2/b\n"
+
+
+def test_no_cache(tmp_path):
+    first = _project(tmp_path, "first")
+    second = _project(tmp_path, "second")
+
+    assert run_commands([COMMAND], str(first)) == 0
+    assert run_commands([COMMAND], str(second), use_cache=False) == 0
+
+    assert (tmp_path / "projects" / "runs").read_text() == "run\nrun\n"
+
+
+def test_failed_command_is_not_cached(tmp_path):
+    project = _project(tmp_path, "first")
+    command = {"run": "echo run >> ../runs && exit 1", "cache": True}
+
+    assert run_commands([command], str(project)) == 1
+    assert run_commands([command], str(project)) == 1
+
+    assert (tmp_path / "projects" / "runs").read_text() == "run\nrun\n"
+
+
+def test_inputs_change_the_key(tmp_path):
+    project = _project(tmp_path, "first")
+    (project / "requirements.txt").write_text("foo\n")
+    command = {**COMMAND, "inputs": ["requirements.txt"]}
+    key = cache.key(command, str(project))
+
+    (project / "requirements.txt").write_text("bar\n")
+
+    assert cache.key(command, str(project)) != key
+
+
+def test_evict(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_BLOB_GRACE", 0)
+    project = _project(tmp_path, "first")
+    (project / "big").write_bytes(b"x" * 100)
+    before = cache.snapshot(str(project))
+    (project / "big").write_bytes(b"y" * 100)
+    cache.store("old", str(project), before)
+    (project / "big").write_bytes(b"z" * 100)
+    cache.store("new", str(project), before)
+
+    # Least recently used first
+    os.utime(cache._entry_path("old"), (time.time() - 10, time.time() - 10))
+    cache.evict(max_size=150)
+    assert not os.path.exists(cache._entry_path("old"))
+    assert not os.path.exists(cache._blob_path(hashlib.sha256(b"y" * 100).hexdigest()))
+    assert cache.replay("new", str(project))
+
+    # Unused for too long
+    cache.evict(max_age=-1)
+    assert not os.path.exists(cache._entry_path("new"))
+    assert not cache.replay("new", str(project))
+
+
+def test_evict_interval(tmp_path, monkeypatch):
+    evictions = []
+    monkeypatch.setattr(cache, "evict", lambda: evictions.append(time.time()))
+    project = _project(tmp_path, "first")
+    before = cache.snapshot(str(project))
+
+    cache.store("first", str(project), before)
+    cache.store("second", str(project), before)
+    assert len(evictions) == 1
+
+    # Once the interval elapsed, the next store evicts again
+    marker = os.path.join(cache._folder(), "evicted")
+    os.utime(marker, (time.time() - cache._EVICT_INTERVAL - 1,) * 2)
+    cache.store("third", str(project), before)
+    assert len(evictions) == 2
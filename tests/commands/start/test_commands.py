@@ -1,4 +1,15 @@
-from projectstarter.commands.start import parse_commands
+import concurrent.futures
+import time
+
+import pytest
+
+from projectstarter.commands.start import parse_commands, run_commands
+from projectstarter.commands.start.commands import (
+    _RingBuffer,
+    _check_cycles,
+    _dependencies,
+    _normalize_command,
+)
 
 
 def test_parse_commands_simple():
@@ -79,3 +90,97 @@ def test_parse_commands_nested_complex_option(data_tree):
 
     parse_commands(data_tree)
     assert data_tree["commands"] == expected
+
+
+def test_parse_commands_mapping():
+    data_tree = {
+        "commands": ["{{ options.license.commands }}", "git init"],
+        "options": {"license": {"name": "mit", "commands": [{"run": "echo {{ name }}", "group": "license"}]}},
+    }
+    expected = [{"run": "echo mit", "group": "license"}, "git init"]
+
+    parse_commands(data_tree)
+    assert data_tree["commands"] == expected
+
+
+def test_dependencies():
+    commands = [
+        _normalize_command(c)
+        for c in [
+            {"run": "a1", "group": "a"},
+            {"run": "b1", "group": "b"},
+            {"run": "a2", "group": "a"},
+            "barrier",
+            {"run": "c1", "group": "c", "after": ["d"]},
+            {"run": "d1", "group": "d"},
+        ]
+    ]
+    expected = [set(), set(), {0}, {0, 1, 2}, {3, 5}, {3}]
+
+    assert _dependencies(commands) == expected
+
+
+def test_dependencies_cycle():
+    commands = [
+        _normalize_command(c)
+        for c in [
+            {"run": "a1", "group": "a", "after": ["b"]},
+            {"run": "b1", "group": "b", "after": "a"},
+        ]
+    ]
+
+    with pytest.raises(Exception, match="cycle"):
+        _check_cycles(commands, _dependencies(commands))
+
+
+def test_run_commands_order(tmp_path):
+    commands = [
+        {"run": "sleep 0.2 && echo a >> out", "group": "a"},
+        {"run": "echo b >> out", "group": "b", "after": ["a"]},
+        {"run": "echo c >> out", "group": "c"},
+        "echo d >> out",
+    ]
+
+    assert run_commands(commands, str(tmp_path), jobs=4) == 0
+    assert (tmp_path / "out").read_text().split() == ["c", "a", "b", "d"]
+
+
+def test_run_commands_in_threads(tmp_path):
+    # Batches run the commands of each project in a worker thread
+    folders = [tmp_path / "a", tmp_path / "b"]
+    for folder in folders:
+        folder.mkdir()
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        ret_vals = list(executor.map(lambda folder: run_commands(["echo ok > out"], str(folder)), folders))
+
+    assert ret_vals == [0, 0]
+    assert all((folder / "out").read_text() == "ok\n" for folder in folders)
+
+
+def test_run_commands_error(tmp_path):
+    assert run_commands(["exit 3", "echo ok"], str(tmp_path)) == 1
+
+
+def test_run_commands_timeout_kills_process_group(tmp_path):
+    commands = [{"run": "(sleep 0.5; echo late > out) & sleep 5", "timeout": 0.2}]
+
+    assert run_commands(commands, str(tmp_path)) == 1
+    # The background child would have written its file by now
+    time.sleep(0.6)
+    assert not (tmp_path / "out").exists()
+
+
+def test_run_commands_log_folder(tmp_path):
+    commands = ["echo out; echo err >&2"]
+
+    assert run_commands(commands, str(tmp_path), log_folder="logs") == 0
+    assert sorted((tmp_path / "logs" / "01.log").read_text().split()) == ["err", "out"]
+
+
+def test_ring_buffer():
+    buffer = _RingBuffer(4)
+    buffer.write(b"abc")
+    buffer.write(b"def")
+
+    assert buffer.getvalue() == b"cdef"
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from projectstarter import config
+from projectstarter.commands.start.files import _copy_files, copy_template_files
+from projectstarter.commands.start.outputs import DirectoryOutput
+
+
+@pytest.mark.parametrize("jobs,executor", [(1, "thread"), (4, "thread"), (2, "process")])
+def test_copy_files_collects_every_error(tmp_path, jobs, executor):
+    template_folder = os.path.join(config.templates_folder, "python3")
+    paths_to_copy = {
+        os.path.join(template_folder, "does_not_exist.j2"): "a",
+        os.path.join(template_folder, "Makefile.j2"): "sub/Makefile",
+        os.path.join(template_folder, "does_not_exist_either.j2"): "b",
+    }
+    data = {"project": {"name": "foo", "slug": "foo"}, "options": {}}
+
+    hashes, errors = _copy_files(paths_to_copy, data, DirectoryOutput(str(tmp_path)), jobs, executor)
+
+    assert [os.path.basename(src) for src, _ in errors] == ["does_not_exist.j2", "does_not_exist_either.j2"]
+    assert os.path.isfile(tmp_path / "sub" / "Makefile")
+    assert list(hashes) == ["sub/Makefile"]
+
+
+def test_copy_template_files_static(tmp_path, monkeypatch):
+    folder = tmp_path / "templates"
+    (folder / "foo").mkdir(parents=True)
+    (folder / "foo" / "metadata.yml").write_text("description: foo template\n")
+    (folder / "foo" / "raw.txt.j2").write_text("raw content\n")
+    (folder / "foo" / "logo.png").write_bytes(b"\x89PNG\r\n\0")
+    monkeypatch.setattr(config, "templates_folder", str(folder))
+    data = {"files": ["raw.txt.j2", "logo.png"], "options": {}}
+
+    copy_template_files("foo", data, str(tmp_path / "out"))
+    assert (tmp_path / "out" / "raw.txt").read_text() == "raw content"
+    assert (tmp_path / "out" / "logo.png").read_bytes() == b"\x89PNG\r\n\0"
+
+    # A file changed since it was indexed is classified again
+    (folder / "foo" / "raw.txt.j2").write_text("{{ 'rendered' }} content\n")
+    copy_template_files("foo", data, str(tmp_path / "out"), force=True)
+    assert (tmp_path / "out" / "raw.txt").read_text() == "rendered content"
+
+
+def test_copy_template_files_paths(tmp_path):
+    data = {"project": {"name": "foo", "slug": "foo"}, "options": {}, "files": ["{{ project.slug }}/log.py.j2"]}
+    output_path = tmp_path / "out.j2"
+
+    copy_template_files("python3", data, str(output_path))
+
+    # Only the template part of the path is rendered and stripped of its extension
+    assert os.path.isfile(output_path / "foo" / "log.py")
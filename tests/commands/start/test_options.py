@@ -78,3 +78,20 @@ def test_filter_options_nested_multiple(data_tree):
 
 def test_filter_all_options(data_tree):
     assert filter_options([], data_tree) == data_tree.get("options", {})
+
+
+def test_filter_options_simple_after_nested(data_tree):
+    patterns = [f"license{config.options_sep}mit", "license"]
+    expected_res = {"license": {"commands": data_tree["options"]["license"]["commands"]}}
+
+    assert filter_options(patterns, data_tree) == expected_res
+
+
+def test_filter_options_regex_nested(data_tree):
+    patterns = [f"license{config.options_sep}(mit|lgpl)"]
+
+    assert list(filter_options(patterns, data_tree)["license"]["options"].keys()) == ["mit", "lgpl3"]
+
+
+def test_filter_options_invalid_pattern(data_tree):
+    assert filter_options([f"license{config.options_sep}(mit"], data_tree) is None
@@ -0,0 +1,173 @@
+import io
+import os
+import subprocess
+import sys
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+from projectstarter.commands import start
+from projectstarter.commands.start import copy_template_files, outputs
+from projectstarter.commands.start.outputs import DirectoryOutput, MemoryOutput, Output, archive_format
+from projectstarter.utils import files
+
+_DATA = {
+    "project": {"name": "foo", "slug": "foo"},
+    "options": {},
+    "files": ["Makefile.j2", "src/main.sh.j2", "src/log.sh.j2"],
+}
+
+
+def test_memory_output():
+    output = MemoryOutput()
+
+    hashes = copy_template_files("bash", _DATA, output)
+
+    assert sorted(output.files.keys()) == ["Makefile", "src/log.sh", "src/main.sh"]
+    assert sorted(hashes.keys()) == sorted(output.files.keys())
+
+
+def test_output_abstract():
+    class Incomplete(Output):
+        def write(self, path, content):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("extension", [".tar", ".tar.gz", ".zip"])
+def test_archive_output(tmp_path, extension):
+    archive = tmp_path / f"foo{extension}"
+    args = start.parse("project start", ["bash", str(tmp_path / "foo"), "-o", "logging", "--archive", str(archive)])
+
+    assert start.run(args) == 0
+    assert not os.path.exists(tmp_path / "foo")
+
+    memory = MemoryOutput()
+    copy_template_files("bash", _DATA, memory)
+    if extension == ".zip":
+        with zipfile.ZipFile(archive) as f:
+            content = {name: f.read(name) for name in f.namelist()}
+    else:
+        with tarfile.open(archive) as f:
+            content = {member.name: f.extractfile(member).read() for member in f.getmembers()}
+    assert content.keys() == {f"foo/{path}" for path in memory.files}
+    assert content["foo/src/log.sh"] == memory.files["src/log.sh"]
+
+
+def test_archive_output_stdout(tmp_path, monkeypatch):
+    stdout = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr("sys.stdout", stdout)
+    args = start.parse("project start", ["bash", str(tmp_path / "foo"), "-o", "readme", "--archive", "-"])
+
+    assert start.run(args) == 0
+    stdout.buffer.seek(0)
+    with tarfile.open(fileobj=stdout.buffer, mode="r|") as f:
+        assert "foo/README.md" in [member.name for member in f]
+
+
+def test_archive_format():
+    assert archive_format("foo.tgz") == "tar.gz"
+    assert archive_format("foo.zip") == "zip"
+    assert archive_format("-") == "tar"
+
+
+@pytest.fixture
+def removed(monkeypatch):
+    # The old project and the staging folders are removed right away, instead of in the background
+    paths = []
+    monkeypatch.setattr(files, "rm_background", lambda path: paths.append(path) or files.rm(path))
+    return paths
+
+
+def test_directory_output_force(tmp_path, removed):
+    tmp_path = tmp_path / "out"
+    (tmp_path / "foo").mkdir(parents=True)
+    (tmp_path / "foo" / "old").write_text("")
+
+    copy_template_files("bash", _DATA, str(tmp_path / "foo"), force=True)
+
+    assert sorted(os.listdir(tmp_path / "foo")) == ["Makefile", "src"]
+    assert os.listdir(tmp_path) == ["foo"]
+    assert len(removed) == 1
+
+
+def test_directory_output_failure(tmp_path, removed):
+    tmp_path = tmp_path / "out"
+    (tmp_path / "foo").mkdir(parents=True)
+    (tmp_path / "foo" / "old").write_text("")
+    data = {**_DATA, "files": _DATA["files"] + ["does_not_exist.j2"]}
+
+    with pytest.raises(Exception):
+        copy_template_files("bash", data, str(tmp_path / "foo"), force=True)
+
+    # The previous project is left untouched
+    assert os.listdir(tmp_path / "foo") == ["old"]
+    assert os.listdir(tmp_path) == ["foo"]
+    assert len(removed) == 1
+
+
+def test_directory_output_stale_staging(tmp_path, removed):
+    # Identifier of a process which no longer exists
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, check=True)
+    dead = int(dead.stdout)
+    host = outputs._hostname()
+    stale = [
+        f".foo.staging-{host}-{dead}-0",
+        f".foo.staging-{host}-{dead}-1.old",
+        f".foo.staging-other-{os.getpid()}-0",
+    ]
+    kept = [f".foo.staging-{host}-{os.getppid()}-0", f".foo.staging-other-{dead}-1", f".bar.staging-{host}-{dead}-0"]
+    for name in stale + kept:
+        (tmp_path / name).mkdir()
+    # Staging folders of other machines are only removed once abandoned
+    old = time.time() - outputs._STAGING_AGE - 60
+    os.utime(tmp_path / stale[2], (old, old))
+
+    output = DirectoryOutput(str(tmp_path / "foo"))
+    output.prepare()
+    output.close()
+
+    assert sorted(os.path.basename(path) for path in removed) == sorted(stale)
+    assert sorted(os.listdir(tmp_path)) == sorted(kept + ["foo"])
+
+
+def test_directory_output_folders(tmp_path, monkeypatch):
+    created = []
+    makedirs = os.makedirs
+    monkeypatch.setattr(
+        os, "makedirs", lambda path, *args, **kwargs: created.append(path) or makedirs(path, *args, **kwargs)
+    )
+    data = {**_DATA, "files": ["{{ project.slug }}"]}
+
+    copy_template_files("python3", data, str(tmp_path / "foo"))
+
+    # Only the leaf folder is created, up front (os.makedirs creates its parent)
+    assert [os.path.basename(path) for path in created if ".foo.staging" in path] == ["example", "foo"]
+
+
+def test_archive_output_process_executor(tmp_path):
+    archive = tmp_path / "foo.tar"
+    args = start.parse(
+        "project start",
+        [
+            "bash",
+            str(tmp_path / "foo"),
+            "-o",
+            "readme",
+            "cli",
+            "--archive",
+            str(archive),
+            "-j",
+            "3",
+            "--executor",
+            "process",
+        ],
+    )
+
+    assert start.run(args) == 0
+    with tarfile.open(archive) as f:
+        assert sorted(f.getnames()) == ["foo/Makefile", "foo/README.md", "foo/src/cli.sh", "foo/src/main.sh"]
@@ -0,0 +1,65 @@
+import json
+import os
+
+from projectstarter import config
+from projectstarter.commands import start
+from projectstarter.commands.start import manifest
+
+
+def _run(output, *options):
+    return start.run(start.parse("project start", ["bash", str(output), "--update", "-o", *options]))
+
+
+def test_update(tmp_path):
+    output = tmp_path / "foo"
+    assert _run(output, "readme", "cli") == 0
+    assert json.loads((output / config.manifest_name).read_text())["files"].keys() == {
+        "Makefile",
+        "README.md",
+        "src/main.sh",
+        "src/cli.sh",
+    }
+
+    # Unchanged files are not written again
+    os.utime(output / "Makefile", (0, 0))
+    assert _run(output, "readme") == 0
+    assert os.stat(output / "Makefile").st_mtime == 0
+
+    # Files no longer selected are removed
+    assert not os.path.exists(output / "src" / "cli.sh")
+    assert os.path.isfile(output / "src" / "main.sh")
+    assert "src/cli.sh" not in json.loads((output / config.manifest_name).read_text())["files"]
+
+
+def test_update_rewrites_missing_files(tmp_path):
+    output = tmp_path / "foo"
+    assert _run(output, "readme") == 0
+    os.remove(output / "README.md")
+
+    assert _run(output, "readme") == 0
+    assert os.path.isfile(output / "README.md")
+
+
+def test_pending_commands(tmp_path):
+    (tmp_path / "requirements.txt").write_text("foo\n")
+    commands = [
+        {"run": "pip install -r requirements.txt", "group": "venv", "inputs": ["requirements.txt"]},
+        {"run": "echo license", "group": "license", "after": ["venv"]},
+    ]
+
+    pending, fingerprints = manifest.pending_commands(commands, str(tmp_path), [])
+    assert pending == commands
+
+    # Nothing changed: nothing to run
+    pending, _ = manifest.pending_commands(commands, str(tmp_path), fingerprints)
+    assert pending == []
+
+    # An input changed: only its command runs again
+    (tmp_path / "requirements.txt").write_text("bar\n")
+    pending, _ = manifest.pending_commands(commands, str(tmp_path), fingerprints)
+    assert pending == [commands[0]]
+
+    # A command waiting for a skipped group does not wait anymore
+    (tmp_path / "requirements.txt").write_text("foo\n")
+    pending, _ = manifest.pending_commands(commands, str(tmp_path), fingerprints[:1])
+    assert pending == [{**commands[1], "after": []}]
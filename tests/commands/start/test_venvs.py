@@ -0,0 +1,87 @@
+import glob
+import os
+import subprocess
+import sys
+
+from projectstarter.commands.start import run_commands, venvs
+
+VENV = {"path": "env", "python": sys.executable, "requirements": "requirements.txt"}
+
+# Commands building an environment, counting their runs outside of the project
+COMMANDS = [
+    {"run": f"'{sys.executable}' -m venv --without-pip env && echo venv >> ../runs", "venv": VENV},
+    {"run": "echo install >> ../runs", "venv": VENV},
+]
+
+
+def _project(tmp_path, name, requirements="foo\n"):
+    project = tmp_path / "projects" / name
+    project.mkdir(parents=True)
+    (project / "requirements.txt").write_text(requirements)
+    return project
+
+
+def test_clone(tmp_path):
+    first = _project(tmp_path, "first")
+    second = _project(tmp_path, "second")
+
+    assert run_commands(COMMANDS, str(first)) == 0
+    assert run_commands(COMMANDS, str(second)) == 0
+
+    # The environment was built once, then cloned and relocated
+    assert (tmp_path / "projects" / "runs").read_text() == "venv\ninstall\n"
+    assert str(second / "env") in (second / "env" / "bin" / "activate").read_text()
+    assert str(first) not in (second / "env" / "bin" / "activate").read_text()
+    p = subprocess.run(
+        [str(second / "env" / "bin" / "python"), "-c", "import sys; print(sys.prefix)"],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert p.stdout.strip() == str(second / "env")
+
+    # The pool keeps its own copy of the files
+    pooled = glob.glob(os.path.join(venvs._folder(), "*", "env", "pyvenv.cfg"))
+    assert len(pooled) == 1
+    assert not os.path.samefile(pooled[0], second / "env" / "pyvenv.cfg")
+
+
+def test_requirements_change_the_key(tmp_path):
+    first = _project(tmp_path, "first")
+    second = _project(tmp_path, "second", "bar\n")
+
+    assert run_commands(COMMANDS, str(first)) == 0
+    assert run_commands(COMMANDS, str(second)) == 0
+
+    assert (tmp_path / "projects" / "runs").read_text() == "venv\ninstall\n" * 2
+
+
+def test_failed_environment_is_not_pooled(tmp_path):
+    first = _project(tmp_path, "first")
+    commands = [COMMANDS[0], {"run": "echo install >> ../runs && exit 1", "venv": VENV}]
+
+    assert run_commands(commands, str(first)) == 1
+
+    assert not os.path.exists(venvs._folder())
+
+
+def test_evict(tmp_path):
+    for name in ["first", "second"]:
+        project = _project(tmp_path, name, name)
+        assert run_commands(COMMANDS, str(project)) == 0
+    assert len(os.listdir(venvs._folder())) == 2
+
+    venvs.evict(max_count=1)
+
+    assert len(os.listdir(venvs._folder())) == 1
+
+
+def test_relocate_only_matches_whole_paths(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "activate").write_text("VIRTUAL_ENV='/x/proj/env'\nOTHER=/x/proj2/env\nROOT=/x/proj\n")
+
+    venvs._copy_tree(
+        str(tmp_path / "src"), str(tmp_path / "dst"), origin="/x/proj", target="/y/new", relocate={"activate"}
+    )
+
+    assert (tmp_path / "dst" / "activate").read_text() == "VIRTUAL_ENV='/y/new/env'\nOTHER=/x/proj2/env\nROOT=/y/new\n"
+    assert venvs._references(str(tmp_path / "src"), "/x/proj2/e") == []
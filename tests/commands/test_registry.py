@@ -0,0 +1,15 @@
+import importlib
+import pkgutil
+
+import projectstarter.commands
+from projectstarter.commands import COMMANDS
+
+
+def test_registry_matches_commands_modules():
+    module_names = [module.name for module in pkgutil.iter_modules(projectstarter.commands.__path__)]
+
+    assert sorted(COMMANDS.keys()) == sorted(module_names)
+    for name, (description, module_name) in COMMANDS.items():
+        module = importlib.import_module(module_name)
+        assert module.__doc__.strip().lower() == description
+        assert callable(module.parse) and callable(module.run)
@@ -0,0 +1,102 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from projectstarter import config
+from projectstarter.utils import daemon
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    templates_folder = tmp_path / "templates"
+    for name in ["bash", "git", "license"]:
+        shutil.copytree(os.path.join(config.templates_folder, name), str(templates_folder / name))
+    (templates_folder / "environ").mkdir()
+    (templates_folder / "environ" / "metadata.yml").write_text(
+        'description: "environment"\ncommands:\n  - "echo $FOO > foo; umask > umask; touch file"\n'
+    )
+    # Unix socket paths are limited in length
+    socket_folder = tempfile.mkdtemp()
+    socket_path = os.path.join(socket_folder, "daemon.sock")
+    monkeypatch.setattr(config, "socket_path", socket_path)
+    monkeypatch.setattr(config, "templates_folder", str(templates_folder))
+    monkeypatch.setattr(config, "cache_folder", str(tmp_path / "cache"))
+
+    env = dict(
+        os.environ,
+        PROJECTSTARTER_TEMPLATES=str(templates_folder),
+        PROJECTSTARTER_CACHE=str(tmp_path / "cache"),
+        PROJECTSTARTER_SOCKET=socket_path,
+    )
+    p = subprocess.Popen(
+        [sys.executable, "-m", "projectstarter", "serve"],
+        env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+
+    yield templates_folder
+
+    p.terminate()
+    p.wait()
+    shutil.rmtree(socket_folder, ignore_errors=True)
+
+
+def test_request(server, capsys):
+    assert daemon.request("templates", []) == 0
+    assert "bash program" in capsys.readouterr().err
+
+    assert daemon.request("info", ["does_not_exist"]) == 1
+
+
+def test_request_reloads_templates(server, capsys):
+    assert daemon.request("templates", []) == 0
+    capsys.readouterr()
+
+    (server / "bash" / "metadata.yml").write_text("description: new bash program\n")
+    assert daemon.request("templates", []) == 0
+    assert "new bash program" in capsys.readouterr().err
+
+
+def test_request_start(server, tmp_path):
+    assert daemon.request("start", ["bash", str(tmp_path / "project"), "-o", "readme"]) == 0
+    assert os.path.isfile(tmp_path / "project" / "README.md")
+
+
+def test_request_environment(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("FOO", "bar")
+    umask = os.umask(0o027)
+    try:
+        assert daemon.request("start", ["environ", str(tmp_path / "project")]) == 0
+    finally:
+        os.umask(umask)
+
+    # The commands run with the client's environment variables and umask
+    assert (tmp_path / "project" / "foo").read_text() == "bar\n"
+    assert int((tmp_path / "project" / "umask").read_text(), 8) == 0o027
+    assert os.stat(tmp_path / "project" / "file").st_mode & 0o777 == 0o640
+
+
+def test_request_other_cache(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_folder", str(tmp_path / "other"))
+
+    assert daemon.request("templates", []) is None
+
+
+def test_socket_permissions(server):
+    # Only the current user can connect
+    assert os.stat(config.socket_path).st_mode & 0o077 == 0
+
+
+def test_request_without_daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "socket_path", str(tmp_path / "daemon.sock"))
+
+    assert daemon.request("templates", []) is None
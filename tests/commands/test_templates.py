@@ -0,0 +1,45 @@
+import io
+
+import pytest
+
+from projectstarter.commands import templates
+from projectstarter.utils import logger
+
+
+def _run(args):
+    stream = io.StringIO()
+    with logger.redirect(stream):
+        ret_val = templates.run(templates.parse("project templates", args))
+    return ret_val, stream.getvalue()
+
+
+def test_filter():
+    ret_val, output = _run(["--filter", "^py"])
+
+    assert not ret_val
+    names = [line.split()[0] for line in output.splitlines()[1:]]
+    assert names == ["python3"]
+
+
+def test_filter_no_match():
+    ret_val, output = _run(["--filter", "^does_not_exist"])
+
+    assert ret_val == 1
+    assert output == "No templates found.\n"
+
+
+def test_search():
+    ret_val, output = _run(["--search", "pyhton", "--limit", "1"])
+
+    assert not ret_val
+    assert output.splitlines()[1].split()[0] == "python3"
+
+
+def test_filter_and_search():
+    with pytest.raises(SystemExit):
+        templates.parse("project templates", ["--filter", "^py", "--search", "python"])
+
+
+def test_invalid_filter():
+    with pytest.raises(SystemExit):
+        templates.parse("project templates", ["--filter", "("])
@@ -0,0 +1,16 @@
+import pytest
+
+from projectstarter import config
+from projectstarter.utils import catalog, search, templates
+
+
+@pytest.fixture(autouse=True)
+def cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_folder", str(tmp_path / "cache"))
+    catalog.reset()
+    templates.reset()
+    search.reset()
+    yield config.cache_folder
+    catalog.reset()
+    templates.reset()
+    search.reset()
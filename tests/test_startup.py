@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+# Maximum cold import time of the projectstarter modules, in milliseconds
+IMPORT_BUDGET_MS = int(os.environ.get("PROJECTSTARTER_IMPORT_BUDGET_MS", 150))
+
+# Modules that must only be imported by the commands needing them
+HEAVY_MODULES = ["jinja2", "yaml", "slugify", "pkg_resources"]
+
+
+def _import_times(*args):
+    """
+    Run the program with import time tracing.
+    :returns: Dictionary of top level imported module name to cumulative import time in microseconds
+    """
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "projectstarter", *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    times = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Nested imports are indented, their time is part of their parent's
+        if not name[1:].startswith(" "):
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_version_does_not_import_heavy_modules():
+    p = subprocess.run(
+        [sys.executable, "-c", "import sys, projectstarter.commands; print(' '.join(sys.modules))"],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    modules = p.stdout.split()
+
+    assert "projectstarter.commands" in modules
+    assert [name for name in HEAVY_MODULES if name in modules] == []
+
+
+def test_version_import_time_budget():
+    times = _import_times("--version")
+    total = sum(t for name, t in times.items() if name.split(".")[0] == "projectstarter")
+
+    assert total / 1000 < IMPORT_BUDGET_MS
@@ -0,0 +1,15 @@
+import pytest
+
+from projectstarter import config
+
+
+@pytest.fixture
+def templates_folder(tmp_path, monkeypatch):
+    folder = tmp_path / "templates"
+    (folder / "foo" / "src").mkdir(parents=True)
+    (folder / "foo" / "metadata.yml").write_text("description: foo template\n")
+    (folder / "foo" / "src" / "main.sh.j2").write_text("echo foo\n")
+    (folder / "bar").mkdir()
+    (folder / "bar" / "metadata.yml").write_text("description: bar template\n")
+    monkeypatch.setattr(config, "templates_folder", str(folder))
+    return folder
@@ -0,0 +1,44 @@
+import os
+import shutil
+
+from projectstarter import config
+from projectstarter.utils import bundles, catalog, templates
+
+
+def _bundle(templates_folder, name):
+    template_entry = catalog.entry(name)
+    bundles.build(
+        str(templates_folder / name),
+        template_entry["metadata"],
+        template_entry["files"],
+        str(templates_folder / f"{name}{bundles.EXTENSION}"),
+    )
+    shutil.rmtree(str(templates_folder / name))
+    catalog.reset()
+
+
+def test_bundle_read(templates_folder):
+    _bundle(templates_folder, "foo")
+
+    bundle = bundles.open_bundle(str(templates_folder / "foo.bundle"))
+    assert bundle.metadata == {"description": "foo template"}
+    assert bundle.files() == ["src/main.sh.j2"]
+    assert bundle.read("src/main.sh.j2") == b"echo foo\n"
+
+
+def test_bundle_catalog(templates_folder):
+    _bundle(templates_folder, "foo")
+
+    entries = catalog.entries()
+    assert list(entries.keys()) == ["bar", "foo"]
+    assert entries["foo"]["bundle"] == str(templates_folder / "foo.bundle")
+    assert entries["foo"]["files"] == ["src/main.sh.j2"]
+    assert templates.metadata("foo") == {"description": "foo template"}
+
+
+def test_bundle_parse(templates_folder):
+    (templates_folder / "foo" / "src" / "main.sh.j2").write_text("echo {{ name }}\n")
+    _bundle(templates_folder, "foo")
+
+    path = os.path.join(config.templates_folder, "foo", "src", "main.sh.j2")
+    assert templates.parse(path, {"name": "bar"}) == "echo bar"
@@ -0,0 +1,105 @@
+import datetime
+import os
+
+import pytest
+
+from projectstarter.utils import catalog, io
+
+
+def _forbid_yaml(monkeypatch):
+    def yaml_load(content):
+        raise AssertionError("the metadata should be served from the catalog and the compiled metadata")
+
+    monkeypatch.setattr(io, "yaml_load_str", yaml_load)
+
+
+def test_entries(templates_folder):
+    entries = catalog.entries()
+
+    assert list(entries.keys()) == ["bar", "foo"]
+    assert entries["foo"]["description"] == "foo template"
+    assert entries["foo"]["files"] == ["src/main.sh.j2"]
+
+
+def test_entries_served_from_index(templates_folder, monkeypatch):
+    catalog.entries()
+    catalog.reset()
+    _forbid_yaml(monkeypatch)
+
+    assert catalog.entry("foo")["metadata"] == {"description": "foo template"}
+
+
+def test_entries_rebuilt_incrementally(templates_folder, monkeypatch):
+    catalog.entries()
+    catalog.reset()
+
+    (templates_folder / "foo" / "metadata.yml").write_text("description: new foo template\n")
+    (templates_folder / "foo" / "src" / "cli.sh.j2").write_text("echo cli\n")
+    loaded = []
+    yaml_load = io.yaml_load_str
+    monkeypatch.setattr(io, "yaml_load_str", lambda content: loaded.append(content) or yaml_load(content))
+
+    entries = catalog.entries()
+    assert loaded == ["description: new foo template\n"]
+    assert entries["foo"]["description"] == "new foo template"
+    assert entries["foo"]["files"] == ["src/cli.sh.j2", "src/main.sh.j2"]
+
+
+def test_entries_keep_yaml_values(templates_folder):
+    (templates_folder / "foo" / "metadata.yml").write_text(
+        "description: foo template\ncreated: 2020-01-02\nids: {1: one}\n"
+    )
+    catalog.entries()
+    assert os.path.isfile(catalog._index_path())
+    catalog.reset()
+
+    # Values JSON can not hold are loaded again from the metadata
+    template_metadata = catalog.entry("foo")["metadata"]
+    assert template_metadata["created"] == datetime.date(2020, 1, 2)
+    assert template_metadata["ids"] == {1: "one"}
+
+
+def test_entry_does_not_exist(templates_folder):
+    assert catalog.entry("does_not_exist") is None
+
+
+@pytest.mark.parametrize(
+    "content,kind",
+    [
+        (b"echo foo\n", "raw"),
+        (b"echo {{ project.name }}\n", "template"),
+        (b"{% if foo %}foo{% endif %}", "template"),
+        (b"echo foo\r\n", "template"),
+        (b"\x89PNG\r\n\x1a\n\0", "binary"),
+        (b"\xff\xfe", "binary"),
+    ],
+)
+def test_classify(content, kind):
+    assert catalog.classify(content) == kind
+
+
+def test_static_files(templates_folder):
+    (templates_folder / "foo" / "src" / "cli.sh.j2").write_text("echo {{ project.name }}\n")
+    (templates_folder / "foo" / "logo.png").write_bytes(b"\x89PNG\0\n")
+
+    static = catalog.entry("foo")["static"]
+    assert sorted(static.keys()) == ["logo.png", "src/main.sh.j2"]
+    assert static["logo.png"]["kind"] == "binary"
+    assert static["logo.png"]["size"] == 6
+    # The trailing newline is dropped, like Jinja does
+    assert static["src/main.sh.j2"]["kind"] == "raw"
+    assert static["src/main.sh.j2"]["size"] == len("echo foo")
+
+
+def test_include_exclude(templates_folder):
+    (templates_folder / "foo" / "metadata.yml").write_text("exclude: [build]\ninclude: ['*.j2']\n")
+    (templates_folder / "foo" / "build").mkdir()
+    (templates_folder / "foo" / "build" / "out.j2").write_text("")
+    (templates_folder / "foo" / "notes.txt").write_text("")
+
+    assert catalog.entry("foo")["files"] == ["src/main.sh.j2"]
+
+
+def test_destination():
+    assert catalog.destination("src/main.sh.j2") == ["src/main.sh", True]
+    assert catalog.destination("{{ project.slug }}/cli.py.j2") == ["{{ project.slug }}/cli.py.j2", False]
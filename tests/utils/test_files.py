@@ -0,0 +1,91 @@
+import errno
+import os
+
+import pytest
+
+from projectstarter.utils import files
+
+
+@pytest.mark.parametrize("size,offset", [(0, 0), (5, 0), (11, 0), (4, 6)])
+def test_copy_range(tmp_path, size, offset):
+    src = tmp_path / "src"
+    src.write_bytes(b"hello\0world")
+
+    files.copy_range(str(src), str(tmp_path / "dst"), size, offset)
+
+    assert (tmp_path / "dst").read_bytes() == b"hello\0world"[offset : offset + size]
+
+
+def test_copy_range_fallback(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    src.write_bytes(b"x" * (3 * 1024 * 1024))
+    monkeypatch.setattr(files, "_reflink", lambda src_fd, dst_fd: False)
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.delattr(os, "sendfile", raising=False)
+
+    files.copy_range(str(src), str(tmp_path / "dst"), 2 * 1024 * 1024 + 1, 1)
+
+    assert (tmp_path / "dst").stat().st_size == 2 * 1024 * 1024 + 1
+
+
+def test_walk(tmp_path, monkeypatch):
+    for path in ["a.txt", "b/c.txt", "b/d/e.txt", "b/d/f.log", "node_modules/g/h.txt"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("")
+    scanned = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: scanned.append(path) or scandir(path))
+
+    walked = {path: entry.is_dir() for path, entry in files.walk(str(tmp_path), exclude=["node_modules", "*.log"])}
+
+    assert walked == {"a.txt": False, "b": True, "b/c.txt": False, "b/d": True, "b/d/e.txt": False}
+    # Every folder is listed once, excluded folders are not visited
+    assert sorted(scanned) == sorted(os.path.join(str(tmp_path), folder) for folder in ["", "b", "b/d"])
+
+
+def test_walk_include(tmp_path):
+    for path in ["a.txt", "b/a.txt", "b/c.md"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("")
+
+    assert [path for path, _ in files.walk(str(tmp_path), include=["b/*"])] == ["b", "b/a.txt", "b/c.md"]
+    assert sorted(path for path, entry in files.walk(str(tmp_path), include=["a.txt"]) if entry.is_file()) == [
+        "a.txt",
+        "b/a.txt",
+    ]
+
+
+def test_copy_range_sendfile_unsupported(tmp_path, monkeypatch):
+    # macOS: no copy_file_range, and sendfile only writes to sockets
+    def sendfile(out_fd, in_fd, offset, count):
+        raise OSError(errno.ENOTSOCK, "Socket operation on non-socket")
+
+    src = tmp_path / "src"
+    src.write_bytes(b"hello world")
+    monkeypatch.setattr(files, "_reflink", lambda src_fd, dst_fd: False)
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.setattr(os, "sendfile", sendfile, raising=False)
+
+    files.copy_range(str(src), str(tmp_path / "dst"), 5, 6)
+
+    assert (tmp_path / "dst").read_bytes() == b"world"
+
+
+@pytest.mark.parametrize("hardlink", [False, True])
+def test_clone_fallback(tmp_path, monkeypatch, hardlink):
+    src = tmp_path / "src"
+    src.write_bytes(b"#!/bin/sh\n")
+    src.chmod(0o755)
+    monkeypatch.setattr(files, "_reflink", lambda src_fd, dst_fd: False)
+
+    files.clone(str(src), str(tmp_path / "dst"), hardlink)
+
+    assert (tmp_path / "dst").read_bytes() == b"#!/bin/sh\n"
+    assert (tmp_path / "dst").stat().st_mode & 0o777 == 0o755
+    assert os.path.samefile(src, tmp_path / "dst") == hardlink
+
+
+def test_path_pattern():
+    pattern = files.path_pattern("/x/proj")
+
+    assert pattern.sub(b"/y", b"/x/proj /x/proj/a '/x/proj' /x/proj2 /x/project") == b"/y /y/a '/y' /x/proj2 /x/project"
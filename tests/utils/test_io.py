@@ -0,0 +1,34 @@
+import pytest
+
+from projectstarter.utils import io
+
+
+@pytest.fixture(params=sorted(io.backends.keys()))
+def backend(request):
+    io.use_backend(request.param)
+    yield request.param
+    io.use_backend("libyaml" if "libyaml" in io.backends else "python")
+
+
+def test_yaml_load_str(backend):
+    assert io.yaml_load_str("a: [1, b]") == {"a": [1, "b"]}
+
+
+def test_yaml_load_compiled(tmp_path, monkeypatch):
+    path = tmp_path / "metadata.yml"
+    path.write_text("description: foo\n")
+    assert io.yaml_load_compiled(str(path)) == {"description": "foo"}
+
+    # Served from the compiled version
+    yaml_load_str = io.yaml_load_str
+    monkeypatch.setattr(io, "yaml_load_str", None)
+    assert io.yaml_load_compiled(str(path)) == {"description": "foo"}
+
+    # Invalidated when the source changes
+    monkeypatch.setattr(io, "yaml_load_str", yaml_load_str)
+    path.write_text("description: bar\n")
+    assert io.yaml_load_compiled(str(path)) == {"description": "bar"}
+
+
+def test_yaml_load_compiled_does_not_exist(tmp_path):
+    assert io.yaml_load_compiled(str(tmp_path / "metadata.yml")) is None
@@ -0,0 +1,49 @@
+import io
+import json
+import logging
+
+from projectstarter.utils import logger
+
+
+class _Value:
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "value"
+
+
+def test_debug_is_lazy():
+    value = _Value()
+    with logger.redirect(io.StringIO(), verbose=False):
+        logger.debug("Data:", value)
+    assert value.formatted == 0
+
+    stream = io.StringIO()
+    with logger.redirect(stream, verbose=True):
+        logger.debug("Data:", value, b"bytes")
+    assert value.formatted == 1
+    assert stream.getvalue() == "debug: Data: value bytes\n"
+
+
+def test_setup_is_idempotent():
+    handlers = list(logging.getLogger("ProjectStarter").handlers)
+    logger.setup()
+    logger.setup(verbose=True)
+
+    added = [h for h in logging.getLogger("ProjectStarter").handlers if h not in handlers]
+    assert len(added) <= 1
+    assert logging.getLogger("ProjectStarter").level == logging.DEBUG
+    logger.setup()
+
+
+def test_json_format():
+    stream = io.StringIO()
+    with logger.redirect(stream, log_format="json"):
+        logger.error("unable to copy", "'foo'", prefix="  ")
+
+    entry = json.loads(stream.getvalue())
+    assert entry["level"] == "error"
+    assert entry["message"] == "unable to copy 'foo'"
+    assert entry["prefix"] == "  "
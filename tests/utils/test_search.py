@@ -0,0 +1,82 @@
+import pytest
+
+from projectstarter.utils import search, templates
+
+
+@pytest.fixture
+def search_templates(templates_folder):
+    (templates_folder / "foo" / "metadata.yml").write_text(
+        "description: foo template\n"
+        "options:\n"
+        "  license:\n"
+        "    description: add a license\n"
+        "    options:\n"
+        "      mit:\n"
+        "        description: MIT license\n"
+    )
+    (templates_folder / "python3").mkdir()
+    (templates_folder / "python3" / "metadata.yml").write_text(
+        "description: python program\noptions:\n  cli:\n    description: command line interface\n"
+    )
+    return templates_folder
+
+
+def _names(results):
+    return [result["name"] for result in results]
+
+
+def test_documents(search_templates):
+    assert search.documents() == [
+        {"name": "bar", "description": "bar template"},
+        {"name": "foo", "description": "foo template"},
+        {"name": "python3", "description": "python program"},
+    ]
+
+
+def test_search_ranked(search_templates):
+    # Name matches rank above description matches
+    assert _names(search.search("python")) == ["python3"]
+    assert _names(search.search("template")) == ["bar", "foo"]
+    assert _names(search.search("bar")) == ["bar"]
+
+
+def test_search_options(search_templates):
+    results = list(search.search("mit"))
+
+    assert _names(results) == ["foo"]
+    assert results[0]["options"] == ["license:mit"]
+    assert _names(search.search("interface")) == ["python3"]
+
+
+def test_search_fuzzy(search_templates):
+    assert _names(search.search("pyhton")) == ["python3"]
+    assert _names(search.search("licence")) == ["foo"]
+    assert _names(search.search("zzz")) == []
+
+
+def test_search_every_term(search_templates):
+    assert _names(search.search("foo license")) == ["foo"]
+    assert _names(search.search("python license")) == []
+
+
+def test_search_pagination(search_templates):
+    assert _names(search.search("template", 0, 1)) == ["bar"]
+    assert _names(search.search("template", 1, 1)) == ["foo"]
+    assert _names(search.search("template", 2, 1)) == []
+
+
+def test_search_index_persisted(search_templates, monkeypatch):
+    list(search.search("foo"))
+    search.reset()
+    monkeypatch.setattr(templates, "metadata", lambda name: pytest.fail("the index should be loaded from disk"))
+
+    assert _names(search.search("foo")) == ["foo"]
+
+
+def test_search_index_rebuilt(search_templates):
+    assert _names(search.search("baz")) == []
+
+    (search_templates / "baz").mkdir()
+    (search_templates / "baz" / "metadata.yml").write_text("description: baz template\n")
+
+    assert _names(search.search("baz")) == ["baz"]
@@ -0,0 +1,92 @@
+import os
+
+from projectstarter import config
+from projectstarter.utils import catalog, templates
+
+
+def test_parse_uses_bytecode_cache(cache_folder):
+    path = os.path.join(config.templates_folder, "python3", "README.md.j2")
+
+    templates.compile(path)
+    cached = os.listdir(os.path.join(cache_folder, "jinja"))
+    assert len(cached) == 1
+
+    templates.reset()
+    out = templates.parse(path, {"project": {"name": "foo", "slug": "foo"}, "options": {}})
+    assert "foo" in out
+    assert os.listdir(os.path.join(cache_folder, "jinja")) == cached
+
+
+def test_clear_cache(cache_folder):
+    path = os.path.join(config.templates_folder, "python3", "README.md.j2")
+
+    templates.compile(path)
+    templates.clear_cache()
+    assert os.listdir(os.path.join(cache_folder, "jinja")) == []
+
+
+def test_parse_string_compiles_once():
+    templates.parse_string("{{ a }}", {"a": 1})
+    templates.parse_string("{{ a }}", {"a": 2})
+    templates.parse_string("{{ b }}", {"b": 3})
+
+    info = templates.cache_info()
+    assert (info.hits, info.misses) == (1, 2)
+
+
+def test_metadata_includes(templates_folder):
+    (templates_folder / "foo" / "metadata.yml").write_text(
+        "description: foo\n"
+        "files: [a, b]\n"
+        "options:\n"
+        "  bar:\n"
+        "    files: [b]\n"
+        "    include_templates: [bar]\n"
+        "include_templates: [bar]\n"
+    )
+    (templates_folder / "bar" / "metadata.yml").write_text(
+        "description: bar\nfiles: [b, c, c]\ncommands: [{run: echo bar}]\n"
+    )
+
+    expected = {
+        "description": "foo",
+        "files": ["a", "b", "c"],
+        "commands": [{"run": "echo bar"}],
+        "options": {
+            "bar": {
+                "description": "bar",
+                "files": ["b", "c"],
+                "commands": [{"run": "echo bar"}],
+            },
+        },
+    }
+    assert templates.metadata("foo") == expected
+
+
+def test_metadata_includes_loaded_once(templates_folder, monkeypatch):
+    (templates_folder / "foo" / "metadata.yml").write_text(
+        "options:\n  a: {include_templates: [bar]}\n  b: {include_templates: [bar]}\n"
+    )
+    loaded = []
+    entry = catalog.entry
+    monkeypatch.setattr(catalog, "entry", lambda name: loaded.append(name) or entry(name))
+
+    foo = templates.metadata("foo")
+    assert loaded.count("bar") == 1
+
+    # Results handed out are independent copies
+    foo["options"]["a"]["description"] = "modified"
+    assert templates.metadata("foo")["options"]["b"]["description"] == "bar template"
+
+
+def test_metadata_includes_cycle(templates_folder):
+    (templates_folder / "foo" / "metadata.yml").write_text("include_templates: [bar]\n")
+    (templates_folder / "bar" / "metadata.yml").write_text("options: {foo: {include_templates: [foo]}}\n")
+
+    assert templates.metadata("foo") is None
+
+
+def test_metadata_includes_missing(templates_folder):
+    (templates_folder / "foo" / "metadata.yml").write_text("include_templates: [does_not_exist]\n")
+
+    assert templates.metadata("foo") is None
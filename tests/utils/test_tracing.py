@@ -0,0 +1,54 @@
+import json
+import threading
+
+import pytest
+
+from projectstarter.utils import tracing
+
+
+@pytest.fixture(autouse=True)
+def reset_tracing():
+    tracing.reset()
+    yield
+    tracing.reset()
+
+
+def test_span_disabled():
+    with tracing.span("nothing"):
+        pass
+
+    assert not tracing.enabled()
+
+
+def test_write(tmp_path):
+    tracing.enable()
+    with tracing.span("outer", template="foo"):
+        with tracing.span("inner"):
+            pass
+
+    def work():
+        with tracing.span("other thread"):
+            pass
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    tracing.add("command", 10, 25, tid=tracing.track("command [1]"), returncode=0)
+
+    tracing.write(str(tmp_path / "trace.json"))
+
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert list(spans) == ["inner", "outer", "other thread", "command"]
+    assert spans["outer"]["args"] == {"template": "foo"}
+    assert spans["outer"]["ts"] <= spans["inner"]["ts"]
+    assert spans["inner"]["ts"] + spans["inner"]["dur"] <= spans["outer"]["ts"] + spans["outer"]["dur"]
+    assert spans["other thread"]["tid"] != spans["outer"]["tid"]
+    assert spans["command"]["dur"] == 15
+    assert {
+        "name": "thread_name",
+        "ph": "M",
+        "pid": spans["command"]["pid"],
+        "tid": spans["command"]["tid"],
+        "args": {"name": "command [1]"},
+    } in events